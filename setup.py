@@ -5,6 +5,6 @@ setup(
     version="0.1",
     packages=find_packages(where="src"),
     package_dir={"": "src"},
-    package_data={"mta_api": ["data/*.csv"]},
+    package_data={"mta_api": ["data/*.csv", "data/*.snapshot"]},
     install_requires=[line.strip() for line in open("requirements.txt")],
 )
@@ -0,0 +1,115 @@
+import gzip
+import hashlib
+import json
+from email.utils import formatdate
+from functools import cache
+from typing import Any
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+# Bodies that only change with a deploy; clients revalidate with the ETag
+STATIC_MAX_AGE = 60 * 60  # seconds
+
+
+def http_date(timestamp: float) -> str:
+    """Format an epoch timestamp as an HTTP date (e.g. for Last-Modified)"""
+    return formatdate(timestamp, usegmt=True)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Whether an If-None-Match header matches etag, using the weak
+    comparison HTTP requires for GET/HEAD.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in if_none_match.split(",")
+    )
+
+
+def accepted_encodings(accept_encoding: str | None) -> dict[str, float]:
+    """The content codings of an Accept-Encoding header, with their q-values"""
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        coding, *params = item.split(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+@cache
+def _brotli():
+    """The brotli module, or None: it is an optional dependency"""
+    try:
+        import brotli  # type: ignore[import-not-found]
+    except ImportError:
+        return None
+    return brotli
+
+
+def body_digest(body: bytes) -> str:
+    """Short content hash of body, for strong ETags"""
+    return hashlib.sha256(body).hexdigest()[:20]
+
+
+class EncodedBody:
+    """
+    A JSON body serialized and compressed once, up front, then served as
+    is. Each content coding gets its own strong ETag, since the bytes
+    differ. br is only offered when the brotli package is installed.
+    """
+
+    # Smallest first; the first one the client accepts is sent
+    PREFERENCE = ("br", "gzip")
+
+    def __init__(self, content: Any, max_age: int = STATIC_MAX_AGE):
+        # Same encoding as FastAPI's JSONResponse
+        raw = json.dumps(
+            content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode()
+        digest = body_digest(raw)
+        self.variants: dict[str, tuple[bytes, str]] = {
+            "identity": (raw, f'"{digest}"'),
+            "gzip": (gzip.compress(raw, 9, mtime=0), f'"{digest}-gzip"'),
+        }
+        brotli = _brotli()
+        if brotli is not None:
+            self.variants["br"] = (brotli.compress(raw, quality=11), f'"{digest}-br"')
+        self.cache_control = f"public, max-age={max_age}"
+
+    def coding_for(self, accept_encoding: str | None) -> str:
+        accepted = accepted_encodings(accept_encoding)
+        for coding in self.PREFERENCE:
+            if coding in self.variants and accepted.get(coding, accepted.get("*", 0)):
+                return coding
+        return "identity"
+
+    def response(self, request: Request) -> Response:
+        coding = self.coding_for(request.headers.get("Accept-Encoding"))
+        body, etag = self.variants[coding]
+        headers = {
+            "ETag": etag,
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if etag_matches(request.headers.get("If-None-Match"), etag):
+            return Response(status_code=304, headers=headers)
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        return Response(body, media_type="application/json", headers=headers)
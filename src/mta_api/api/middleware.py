@@ -0,0 +1,44 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from mta_api.services.metrics import HTTP_REQUEST_SECONDS
+from mta_api.utils.logger import request_path
+
+
+class RequestMetricsMiddleware:
+    """
+    Times each HTTP request until its response body is complete, which for
+    a stream is when it closes, and sets request_path for the log sampler.
+    A plain ASGI middleware, so it runs in the request's own task and
+    doesn't buffer or wrap the response.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = request_path.set(scope["path"])
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_path.reset(token)
+            # Label by route template so per-station paths don't explode
+            # cardinality; the router records the matched route in scope
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"], route.path if route else "unmatched", str(status)
+            ).observe(time.perf_counter() - start)
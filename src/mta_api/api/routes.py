@@ -1,11 +1,46 @@
+from collections import defaultdict
 from difflib import get_close_matches
+from functools import cache, lru_cache
+import heapq
+import itertools
+import math
 import re
 from mta_api.utils.logger import get_logger
-from mta_api.data.subway_lines import LINE_TO_STOPS
+from mta_api.data.station_parser import get_stations_dict
 
 logger = get_logger(__name__)
 
 
+NAME_SUBSTITUTIONS = {
+    "st": "street",
+    "sq": "square",
+    "pk": "park",
+    "pkwy": "parkway",
+    "rd": "road",
+    "av": "avenue",
+    "plaza": "plz",
+    "junction": "jct",
+    "heights": "hts",
+}
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+@lru_cache(maxsize=4096)
+def normalize_station_name(name):
+    """
+    Normalize station names for better matching
+    """
+    try:
+        return " ".join(
+            _PUNCTUATION.sub("", NAME_SUBSTITUTIONS.get(word, word))
+            for word in name.lower().split()
+        )
+    except Exception as e:
+        logger.error(f"Error normalizing station name '{name}': {str(e)}")
+        return name
+
+
 class SubwayStationMatcher:
     def __init__(self, station_names):
         """
@@ -18,40 +53,14 @@ class SubwayStationMatcher:
         self.normalized_names = {
             self._normalize_name(name): name for name in station_names
         }
+        self._normalized_keys = list(self.normalized_names)
         logger.debug(f"Created {len(self.normalized_names)} normalized station names")
 
     def _normalize_name(self, name):
         """
         Normalize station names for better matching
         """
-        try:
-            name = name.lower()
-            substitutions = {
-                "st": "street",
-                "sq": "square",
-                "pk": "park",
-                "pkwy": "parkway",
-                "rd": "road",
-                "av": "avenue",
-                "plaza": "plz",
-                "junction": "jct",
-                "heights": "hts",
-            }
-
-            words = name.split()
-            normalized_words = []
-
-            for word in words:
-                word = substitutions.get(word, word)
-                word = re.sub(r"[^\w\s]", "", word)
-                normalized_words.append(word)
-
-            result = " ".join(normalized_words)
-            logger.debug(f"Normalized '{name}' to '{result}'")
-            return result
-        except Exception as e:
-            logger.error(f"Error normalizing station name '{name}': {str(e)}")
-            return name
+        return normalize_station_name(name)
 
     def find_matches(self, query, n=3, cutoff=0.0):
         """
@@ -61,7 +70,7 @@ class SubwayStationMatcher:
         try:
             normalized_query = self._normalize_name(query)
             matches = get_close_matches(
-                normalized_query, list(self.normalized_names.keys()), n=n, cutoff=cutoff
+                normalized_query, self._normalized_keys, n=n, cutoff=cutoff
             )
 
             results = []
@@ -107,6 +116,243 @@ class SubwayStationMatcher:
             return 0.0
 
 
+# Long forms folded onto the abbreviations the station CSV uses
+SEARCH_ABBREVIATIONS = {
+    "street": "st",
+    "avenue": "av",
+    "ave": "av",
+    "square": "sq",
+    "park": "pk",
+    "parkway": "pkwy",
+    "road": "rd",
+    "boulevard": "blvd",
+    "place": "pl",
+    "heights": "hts",
+    "junction": "jct",
+    "plaza": "plz",
+    "center": "ctr",
+    "centre": "ctr",
+}
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def search_key(name: str) -> str:
+    """Canonical form of a station name or query for searching"""
+    words = _NON_WORD.sub(" ", name.lower()).split()
+    return " ".join(SEARCH_ABBREVIATIONS.get(word, word) for word in words)
+
+
+def group_stations(stations) -> list[dict]:
+    """
+    Group stops by (name, complex) into search entries, each with its
+    stop IDs and routes served
+    """
+    groups = defaultdict(list)
+    for station in stations:
+        groups[(station.name, station.complex_id)].append(station)
+
+    return [
+        {
+            "name": name,
+            "complex_id": complex_id,
+            "stop_ids": sorted(station.stop_id for station in members),
+            "routes": sorted({r for station in members for r in station.routes}),
+        }
+        for (name, complex_id), members in sorted(groups.items())
+    ]
+
+
+def trigrams(text: str) -> set[str]:
+    """Character trigrams of text, padded so word starts and ends count"""
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class StationSearchIndex:
+    """
+    Fuzzy station search over a trigram inverted index.
+    Stops are grouped by (name, complex), and candidates are ranked by the
+    IDF-weighted overlap of their trigrams with the query's, so common
+    fragments like "st " count for little.
+    """
+
+    def __init__(self, stations):
+        self.entries = group_stations(stations)
+        self._keys = []
+        entry_grams = []
+        postings: dict[str, list[int]] = defaultdict(list)
+
+        for entry_id, entry in enumerate(self.entries):
+            key = search_key(entry["name"])
+            grams = trigrams(key)
+            self._keys.append(key)
+            entry_grams.append(grams)
+            for gram in grams:
+                postings[gram].append(entry_id)
+
+        count = len(self.entries)
+        self._unseen_weight = math.log(count + 1)
+        self._weights = {
+            gram: math.log((count + 1) / len(ids)) for gram, ids in postings.items()
+        }
+        self._postings = {
+            gram: [(entry_id, self._weights[gram]) for entry_id in ids]
+            for gram, ids in postings.items()
+        }
+        self._entry_weights = [
+            sum(self._weights[gram] for gram in grams) for grams in entry_grams
+        ]
+
+        logger.info(
+            f"Built station search index: {count} stations, "
+            f"{len(self._postings)} trigrams"
+        )
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        """Ranked candidates for query, best first"""
+        key = search_key(query)
+        if not key:
+            return []
+
+        query_grams = trigrams(key)
+        query_weight = sum(
+            self._weights.get(gram, self._unseen_weight) for gram in query_grams
+        )
+
+        shared: dict[int, float] = defaultdict(float)
+        for gram in query_grams:
+            for entry_id, weight in self._postings.get(gram, ()):
+                shared[entry_id] += weight
+
+        scored = []
+        for entry_id, weight in shared.items():
+            # Mostly how much of the query is covered, with Dice as a tiebreak
+            # so shorter names win among equally covering candidates
+            coverage = weight / query_weight
+            dice = 2 * weight / (query_weight + self._entry_weights[entry_id])
+            score = 0.7 * coverage + 0.3 * dice
+            if self._keys[entry_id].startswith(key):
+                score += 0.1
+            scored.append((min(score, 1.0), entry_id))
+
+        scored.sort(key=lambda item: (-item[0], self.entries[item[1]]["name"]))
+        return [
+            {**self.entries[entry_id], "score": round(score, 3)}
+            for score, entry_id in scored[:limit]
+        ]
+
+
+# Abbreviations in the station CSV and the spellings they stand for, so
+# either form autocompletes
+_EXPANSIONS = {
+    "st": ("street",),
+    "sts": ("streets",),
+    "av": ("avenue",),
+    "avs": ("avenues",),
+    "sq": ("square",),
+    "pk": ("park",),
+    "pkwy": ("parkway",),
+    "rd": ("road",),
+    "dr": ("drive",),
+    "ln": ("lane",),
+    "blvd": ("boulevard",),
+    "pl": ("place",),
+    "hts": ("heights",),
+    "hwy": ("highway",),
+    "tpke": ("turnpike",),
+    "jct": ("junction",),
+    "plz": ("plaza",),
+    "ctr": ("center", "centre"),
+    "mt": ("mount",),
+}
+
+
+class StationAutocomplete:
+    """
+    Prefix trie over station names for type-ahead.
+    Every word start of both the abbreviated and the expanded form of a
+    name is inserted, and each node keeps its top completions (most
+    routes first), so a lookup is a walk down the query's characters.
+    """
+
+    MAX_COMPLETIONS = 10
+
+    def __init__(self, stations):
+        self.entries = group_stations(stations)
+        # Rank: more routes first, then shorter and alphabetical names
+        self._rank = {
+            entry_id: (-len(entry["routes"]), len(entry["name"]), entry["name"])
+            for entry_id, entry in enumerate(self.entries)
+        }
+        self._root: dict = {}
+
+        for entry_id, entry in enumerate(self.entries):
+            words = autocomplete_key(entry["name"]).split()
+            abbreviated = [SEARCH_ABBREVIATIONS.get(word, word) for word in words]
+            variants = {" ".join(abbreviated)} | {
+                " ".join(spelling)
+                for spelling in itertools.product(
+                    *(_EXPANSIONS.get(word, (word,)) for word in abbreviated)
+                )
+            }
+            suffixes = {
+                " ".join(variant_words[i:])
+                for variant in variants
+                for variant_words in [variant.split()]
+                for i in range(len(variant_words))
+            }
+            for suffix in suffixes:
+                self._insert(suffix, entry_id)
+
+        self._finalize(self._root)
+        logger.info(f"Built station autocomplete trie for {len(self.entries)} stations")
+
+    def _insert(self, text: str, entry_id: int) -> None:
+        node = self._root
+        for char in text:
+            node = node.setdefault(char, {})
+            node.setdefault(None, set()).add(entry_id)
+
+    def _finalize(self, node: dict) -> None:
+        """Replace each node's entry set with its ranked top completions"""
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            entries = current.pop(None, None)
+            if entries is not None:
+                current[None] = tuple(
+                    heapq.nsmallest(self.MAX_COMPLETIONS, entries, key=self._rank.get)
+                )
+            stack.extend(child for key, child in current.items() if key is not None)
+
+    def complete(self, query: str, limit: int = MAX_COMPLETIONS) -> list[dict]:
+        """Top completions for a typed prefix, best first"""
+        node = self._root
+        for char in autocomplete_key(query):
+            child = node.get(char)
+            if child is None:
+                return []
+            node = child
+        return [self.entries[entry_id] for entry_id in node.get(None, ())[:limit]]
+
+
+@lru_cache(maxsize=4096)
+def autocomplete_key(text: str) -> str:
+    """Lowercase text with punctuation folded to single spaces"""
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+
+@cache
+def get_station_search_index() -> StationSearchIndex:
+    return StationSearchIndex(get_stations_dict().values())
+
+
+@cache
+def get_station_autocomplete() -> StationAutocomplete:
+    return StationAutocomplete(get_stations_dict().values())
+
+
 if __name__ == "__main__":
     logger.info("Starting station matcher test")
     stations = [
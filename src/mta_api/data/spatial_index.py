@@ -0,0 +1,120 @@
+import heapq
+import math
+from collections import defaultdict
+from functools import cache
+
+from mta_api.data.station_parser import get_coords_dict
+from mta_api.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+EARTH_RADIUS_M = 6_371_000
+CELL_DEGREES = 0.01  # roughly 1.1 km north-south, 0.85 km east-west in NYC
+
+
+def haversine(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    """Great-circle distance in meters between two (lon, lat) points"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = (
+        math.sin(d_phi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class StationGrid:
+    """
+    Uniform lon/lat grid over stop coordinates for nearest-stop queries.
+    A query searches rings of cells outward from its own cell and stops
+    once no unvisited cell can hold anything closer than the k-th best.
+    Queries from outside the stops' bounding box check every stop instead.
+    """
+
+    def __init__(
+        self, coords: dict[str, tuple[float, float]], cell_degrees: float = CELL_DEGREES
+    ):
+        self.cell_degrees = cell_degrees
+        self._cells: dict[tuple[int, int], list[tuple[str, float, float]]] = (
+            defaultdict(list)
+        )
+        for stop_id, (lon, lat) in coords.items():
+            self._cells[self._cell(lon, lat)].append((stop_id, lon, lat))
+        self._cells = dict(self._cells)
+
+        xs = [x for x, _ in self._cells] or [0]
+        ys = [y for _, y in self._cells] or [0]
+        self._bounds = (min(xs), max(xs), min(ys), max(ys))
+        max_lat = max((abs(lat) for _, lat in coords.values()), default=0.0)
+        self._max_abs_lat = min(max_lat, 89.0)
+        logger.info(
+            f"Built station grid: {len(coords)} stops in {len(self._cells)} cells"
+        )
+
+    def _cell(self, lon: float, lat: float) -> tuple[int, int]:
+        return (
+            math.floor(lon / self.cell_degrees),
+            math.floor(lat / self.cell_degrees),
+        )
+
+    def _ring(self, cx: int, cy: int, radius: int):
+        if radius == 0:
+            yield cx, cy
+            return
+        for x in range(cx - radius, cx + radius + 1):
+            yield x, cy - radius
+            yield x, cy + radius
+        for y in range(cy - radius + 1, cy + radius):
+            yield cx - radius, y
+            yield cx + radius, y
+
+    def nearest(self, lon: float, lat: float, k: int = 5) -> list[tuple[float, str]]:
+        """The k closest stops to (lon, lat) as (distance in meters, stop ID)"""
+        cx, cy = self._cell(lon, lat)
+        min_x, max_x, min_y, max_y = self._bounds
+        if not (min_x <= cx <= max_x and min_y <= cy <= max_y):
+            # Outside the stops' bounding box the rings would be mostly empty
+            # cells, out to the far edge of it: just measure every stop
+            return self._scan(lon, lat, k)
+        # Ring r is at least r - 1 whole cells away in every direction; a cell
+        # is narrowest east-west at the highest latitude involved
+        widest_lat = max(min(abs(lat), 89.0), self._max_abs_lat)
+        cell_meters = (
+            math.radians(self.cell_degrees)
+            * EARTH_RADIUS_M
+            * math.cos(math.radians(widest_lat))
+        )
+        max_radius = max(
+            abs(cx - min_x), abs(cx - max_x), abs(cy - min_y), abs(cy - max_y)
+        )
+
+        best: list[tuple[float, str]] = []  # max-heap via negated distances
+        for radius in range(max_radius + 1):
+            if len(best) == k and -best[0][0] <= (radius - 1) * cell_meters:
+                break
+            for cell in self._ring(cx, cy, radius):
+                for stop_id, stop_lon, stop_lat in self._cells.get(cell, ()):
+                    distance = haversine(lon, lat, stop_lon, stop_lat)
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, stop_id))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, stop_id))
+
+        return sorted((-distance, stop_id) for distance, stop_id in best)
+
+    def _scan(self, lon: float, lat: float, k: int) -> list[tuple[float, str]]:
+        return heapq.nsmallest(
+            k,
+            (
+                (haversine(lon, lat, stop_lon, stop_lat), stop_id)
+                for stops in self._cells.values()
+                for stop_id, stop_lon, stop_lat in stops
+            ),
+        )
+
+
+@cache
+def get_station_grid() -> StationGrid:
+    return StationGrid(get_coords_dict())
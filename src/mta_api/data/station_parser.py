@@ -2,11 +2,25 @@ import csv
 from collections import defaultdict
 from functools import cache
 from pathlib import Path
+from typing import NamedTuple
+from mta_api.data.station_snapshot import read_snapshot, source_digest, write_snapshot
 from mta_api.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
 CSV_PATH = Path(__file__).parent / "MTA_Subway_Stations_20241024.csv"
+SUBWAY_LINES_PATH = Path(__file__).parent / "subway_lines.py"
+
+
+class StationInfo(NamedTuple):
+    """One row of the station CSV (a single GTFS stop)"""
+
+    stop_id: str
+    name: str
+    complex_id: str
+    routes: tuple[str, ...]
+    north_label: str
+    south_label: str
 
 
 def parse_routes(routes_str: str) -> tuple[str, ...]:
@@ -34,20 +48,67 @@ def parse_coordinates(lat_str: str, lon_str: str) -> tuple[float, float]:
 
 
 @cache
-def process_subway_data() -> tuple[
-    dict[tuple[str, str], str],  # stops_dict
-    dict[str, tuple[float, float]],  # coords_dict
-]:
+def load_station_snapshot() -> dict | None:
+    """The prebuilt station snapshot if it is present and up to date"""
+    return read_snapshot(source_digest([CSV_PATH, SUBWAY_LINES_PATH]))
+
+
+def build_station_snapshot() -> None:
+    """Compile the station CSV and LINE_TO_STOPS into the binary snapshot"""
+    from mta_api.data.subway_lines import LINE_TO_STOPS
+
+    stops_dict, coords_dict, stations_dict = parse_subway_csv()
+    payload = {
+        "stops": stops_dict,
+        "coords": coords_dict,
+        "stations": {stop_id: tuple(info) for stop_id, info in stations_dict.items()},
+        "line_to_stops": LINE_TO_STOPS,
+    }
+    write_snapshot(payload, source_digest([CSV_PATH, SUBWAY_LINES_PATH]))
+
+
+@cache
+def process_subway_data() -> (
+    tuple[
+        dict[tuple[str, str], str],  # stops_dict
+        dict[str, tuple[float, float]],  # coords_dict
+        dict[str, StationInfo],  # stations_dict
+    ]
+):
+    """
+    Load the station dictionaries from the prebuilt snapshot, falling back
+    to parsing the CSV when the snapshot is missing or stale.
+    """
+    snapshot = load_station_snapshot()
+    if snapshot is None:
+        return parse_subway_csv()
+
+    logger.info("Loaded subway data from station snapshot")
+    stations_dict = {
+        stop_id: StationInfo(*fields)
+        for stop_id, fields in snapshot["stations"].items()
+    }
+    return snapshot["stops"], snapshot["coords"], stations_dict
+
+
+def parse_subway_csv() -> (
+    tuple[
+        dict[tuple[str, str], str],  # stops_dict
+        dict[str, tuple[float, float]],  # coords_dict
+        dict[str, StationInfo],  # stations_dict
+    ]
+):
     """
     Process NYC subway stop data from CSV into three dictionaries:
     1. stops_dict - Key: Tuple of (Stop Name, single route), Value: GTFS Stop ID
     2. coords_dict - Key: GTFS Stop ID, Value: Tuple of (longitude, latitude)
-    3. route_stops_dict - Key: Route (e.g., "4"), Value: List of stop names on that route
+    3. stations_dict - Key: GTFS Stop ID, Value: StationInfo for that stop
     """
     logger.info(f"Processing subway data from {CSV_PATH}")
 
     stops_dict = {}
     coords_dict = {}
+    stations_dict = {}
     route_stops_dict = defaultdict(set)  # Using set to avoid duplicates
 
     try:
@@ -85,6 +146,15 @@ def process_subway_data() -> tuple[
                 for route in routes:
                     route_stops_dict[route].add(stop_name)
 
+                stations_dict[stop_id] = StationInfo(
+                    stop_id=stop_id,
+                    name=stop_name,
+                    complex_id=row["Complex ID"],
+                    routes=routes,
+                    north_label=row["North Direction Label"],
+                    south_label=row["South Direction Label"],
+                )
+
             logger.info(
                 f"Processed {row_count} stations with {error_count} coordinate errors"
             )
@@ -96,6 +166,7 @@ def process_subway_data() -> tuple[
             return (
                 stops_dict,
                 coords_dict,
+                stations_dict,
             )
 
     except FileNotFoundError:
@@ -122,8 +193,43 @@ def get_coords_dict() -> dict[str, tuple[float, float]]:
     return process_subway_data()[1]
 
 
+def get_stations_dict() -> dict[str, StationInfo]:
+    """
+    Returns just the stations dictionary mapping GTFS Stop ID to StationInfo
+    """
+    logger.debug("Retrieving stations dictionary")
+    return process_subway_data()[2]
+
+
+@cache
+def get_line_to_stops() -> dict[str, list[str]]:
+    """
+    Returns the route to ordered stop names mapping, from the snapshot when
+    available so the large subway_lines module isn't imported
+    """
+    snapshot = load_station_snapshot()
+    if snapshot is not None:
+        return snapshot["line_to_stops"]
+
+    from mta_api.data.subway_lines import LINE_TO_STOPS
+
+    return LINE_TO_STOPS
+
+
+@cache
+def get_complexes() -> dict[str, list[StationInfo]]:
+    """
+    Returns a dictionary mapping Complex ID to the stops in that complex
+    """
+    complexes = defaultdict(list)
+    for station in get_stations_dict().values():
+        complexes[station.complex_id].append(station)
+    logger.debug(f"Grouped stops into {len(complexes)} station complexes")
+    return dict(complexes)
+
+
 if __name__ == "__main__":
     logger.info("Testing station parser")
-    stops_dict, coords_dict = process_subway_data()
+    stops_dict, coords_dict, _ = process_subway_data()
     logger.info(f"Successfully loaded {len(stops_dict)} stop-route combinations")
     logger.info(f"Successfully loaded coordinates for {len(coords_dict)} stations")
@@ -0,0 +1,87 @@
+"""
+Compact binary snapshot of the static station data.
+
+Layout: MAGIC, format version (uint16), SHA-256 of the source files,
+payload length (uint64), then a marshal payload. The file is read through
+mmap, so the payload is unmarshalled straight from the page cache without
+an intermediate copy; each worker still builds its own objects from it.
+marshal's format can change between Python versions, so the digest covers
+the marshal and Python versions as well as the sources, and a snapshot
+whose digest doesn't match is ignored.
+
+Build it with:
+    python -m mta_api.data.station_snapshot
+"""
+
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+import sys
+from pathlib import Path
+from typing import Any, Iterable
+
+from mta_api.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+SNAPSHOT_PATH = Path(
+    os.getenv("MTA_STATION_SNAPSHOT", Path(__file__).parent / "stations.snapshot")
+)
+
+MAGIC = b"MTASNAP\0"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sH32sQ")
+
+
+def source_digest(paths: Iterable[Path]) -> bytes:
+    """
+    SHA-256 over the format, marshal and Python versions and the contents
+    of paths
+    """
+    versions = (FORMAT_VERSION, marshal.version, *sys.version_info[:2])
+    digest = hashlib.sha256(repr(versions).encode())
+    for path in paths:
+        digest.update(Path(path).read_bytes())
+    return digest.digest()
+
+
+def write_snapshot(payload: Any, digest: bytes, path: Path = SNAPSHOT_PATH) -> None:
+    data = marshal.dumps(payload)
+    tmp_path = Path(f"{path}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, digest, len(data)))
+        f.write(data)
+    os.replace(tmp_path, path)
+    logger.info(f"Wrote station snapshot {path} ({HEADER.size + len(data)} bytes)")
+
+
+def read_snapshot(digest: bytes, path: Path = SNAPSHOT_PATH) -> Any | None:
+    """The snapshot payload, or None if it is missing, corrupt or stale"""
+    try:
+        with (
+            open(path, "rb") as f,
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped,
+        ):
+            magic, version, file_digest, length = HEADER.unpack_from(mapped)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                logger.warning(f"Ignoring station snapshot {path}: unknown format")
+                return None
+            if file_digest != digest:
+                logger.warning(f"Ignoring stale station snapshot {path}")
+                return None
+            with memoryview(mapped)[HEADER.size : HEADER.size + length] as view:
+                return marshal.loads(view)
+    except FileNotFoundError:
+        logger.debug(f"No station snapshot at {path}")
+        return None
+    except (OSError, ValueError, EOFError, TypeError, struct.error) as e:
+        logger.warning(f"Could not read station snapshot {path}: {str(e)}")
+        return None
+
+
+if __name__ == "__main__":
+    from mta_api.data.station_parser import build_station_snapshot
+
+    build_station_snapshot()
@@ -1,16 +1,112 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from functools import cache
+from datetime import datetime, timezone
+
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
-from pydantic import BaseModel
-from typing import Dict, List
-from mta_api.data.station_parser import get_stops_dict, process_subway_data
-from mta_api.services.train_service import process_gtfs_data, URL_DICT
-from mta_api.api.routes import LINE_TO_STOPS
+from fastapi.responses import RedirectResponse, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from pydantic import BaseModel, Field
+from typing import Callable, Dict, List
+from mta_api.data.spatial_index import get_station_grid
+from mta_api.data.station_parser import (
+    get_line_to_stops,
+    get_stations_dict,
+    get_stops_dict,
+    process_subway_data,
+)
+from mta_api.api.http_cache import (
+    EncodedBody,
+    body_digest,
+    etag_matches,
+    http_date,
+)
+from mta_api.api.middleware import RequestMetricsMiddleware
+from mta_api.services.arrival_stream import (
+    MAX_PAIRS_PER_SUBSCRIBER,
+    StreamPair,
+    stream_arrivals,
+    stream_hub,
+)
+from mta_api.services.headway_analytics import headway_report, route_stop_ids
+from mta_api.services.http_client import close_http_client
+from mta_api.services.metrics import ARRIVAL_REQUESTS, feed_label
+from mta_api.services.feed_archive import feed_archive
+from mta_api.services.response_cache import arrivals_cache
+from mta_api.services.station_board import (
+    get_complex_plans,
+    get_station_board,
+    resolve_complex_ids,
+)
+from mta_api.services.train_service import (
+    arrivals_change_at,
+    arrivals_from_snapshot,
+    feed_poller,
+    get_archived_snapshot,
+    get_feed_snapshot,
+    get_nyc_tz,
+    get_url_snapshot,
+    new_feed_message,
+    seconds_until_refresh,
+    URL_DICT,
+)
+from mta_api.api.routes import (
+    get_station_autocomplete,
+    get_station_search_index,
+)
 from mta_api.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-app = FastAPI(title="NYC Subway Times API")
+FEED_POLLER_ENABLED = os.getenv("MTA_FEED_POLLER", "1") == "1"
+WARM_UP_ENABLED = os.getenv("MTA_WARM_UP", "0") == "1"
+
+MAX_BATCH_SIZE = 100
+MAX_ANALYTICS_RANGE = 90 * 24 * 60 * 60  # seconds
+
+
+def warm_up() -> dict[str, float]:
+    """
+    Initialize everything that otherwise loads on first use.
+    Returns the seconds spent on each step.
+    """
+    steps: dict[str, Callable[[], object]] = {
+        "station_data": process_subway_data,
+        "line_to_stops": get_line_to_stops,
+        "route_bodies": get_route_bodies,
+        "station_search": get_station_search_index,
+        "station_autocomplete": get_station_autocomplete,
+        "station_grid": get_station_grid,
+        "complex_plans": get_complex_plans,
+        "feed_bindings": new_feed_message,
+        "timezone": get_nyc_tz,
+    }
+    timings = {}
+    for name, step in steps.items():
+        start = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - start
+    logger.info("Warm-up finished in %.1fms", sum(timings.values()) * 1000)
+    return timings
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARM_UP_ENABLED:
+        warm_up()
+    if FEED_POLLER_ENABLED:
+        await feed_poller.start()
+    yield
+    await feed_poller.stop()
+    await close_http_client()
+
+
+app = FastAPI(title="NYC Subway Times API", lifespan=lifespan)
 
 # TODO: specify this later
 app.add_middleware(
@@ -20,10 +116,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-logger.info("Initializing subway data...")
-process_subway_data()
-logger.info("Subway data loaded successfully")
+# Outermost, so its timing covers the other middleware too
+app.add_middleware(RequestMetricsMiddleware)
 
 
 class StationResponse(BaseModel):
@@ -31,6 +125,15 @@ class StationResponse(BaseModel):
     uptowns: str
 
 
+NO_DATA_BODY = (
+    StationResponse(downtowns="No data", uptowns="No data").model_dump_json().encode()
+)
+
+
+class HistoricalArrivalsResponse(StationResponse):
+    snapshot_time: datetime
+
+
 class RouteStopsResponse(BaseModel):
     stops: List[str]
 
@@ -39,52 +142,141 @@ class ErrorResponse(BaseModel):
     detail: str
 
 
+class ArrivalsQuery(BaseModel):
+    route: str
+    station: str
+
+
+class BatchArrivalsRequest(BaseModel):
+    items: List[ArrivalsQuery] = Field(max_length=MAX_BATCH_SIZE)
+
+
+class BatchArrivalsItem(BaseModel):
+    route: str
+    station: str
+    arrivals: StationResponse | None = None
+    error: str | None = None
+
+
+class BatchArrivalsResponse(BaseModel):
+    results: List[BatchArrivalsItem]
+
+
+class StationCandidate(BaseModel):
+    name: str
+    complex_id: str
+    stop_ids: List[str]
+    routes: List[str]
+    score: float
+
+
+class StationCompletion(BaseModel):
+    name: str
+    complex_id: str
+    stop_ids: List[str]
+    routes: List[str]
+
+
+class NearbyStation(BaseModel):
+    stop_id: str
+    name: str
+    complex_id: str
+    routes: List[str]
+    distance_m: float
+    arrivals: Dict[str, StationResponse] | None = None
+
+
+class DirectionBoard(BaseModel):
+    label: str
+    arrivals: List[str]
+
+
+class RouteBoard(BaseModel):
+    route: str
+    stop_id: str
+    north: DirectionBoard
+    south: DirectionBoard
+
+
+class BoardDeparture(BaseModel):
+    route: str
+    direction: str
+    time: str
+
+
+class StationBoardResponse(BaseModel):
+    complex_id: str
+    stations: List[str]
+    routes: List[RouteBoard]
+    departures: List[BoardDeparture]
+    unavailable_routes: List[str]
+
+
 @app.get("/")
 async def root():
     logger.debug("Redirecting to docs")
     return RedirectResponse(url="/docs")
 
 
+@cache
+def get_route_bodies() -> tuple[EncodedBody, dict[str, EncodedBody]]:
+    """
+    The /routes body and each /routes/{route} body, encoded once; the
+    station data doesn't change while the app runs
+    """
+    line_to_stops = get_line_to_stops()
+    by_route = {
+        route: EncodedBody(RouteStopsResponse(stops=stops).model_dump())
+        for route, stops in line_to_stops.items()
+    }
+    return EncodedBody(line_to_stops), by_route
+
+
 @app.get("/api/v1/routes", response_model=Dict[str, List[str]])
-async def get_routes():
+async def get_routes(request: Request):
     """
     Get all available subway routes and their stops.
     Returns a dictionary mapping route names to lists of station names.
+    The body is precomputed, gzip (or br) encoded when the client accepts
+    it, and carries a strong ETag.
     """
     logger.info("Fetching all routes and stops")
-    return LINE_TO_STOPS
+    all_routes, _ = get_route_bodies()
+    return all_routes.response(request)
 
 
 @app.get("/api/v1/routes/{route}", response_model=RouteStopsResponse)
-async def get_route_stops(route: str):
+async def get_route_stops(route: str, request: Request):
     """
     Get all stops for a specific subway route.
     """
     route = route.upper()
-    logger.info(f"Fetching stops for route {route}")
+    logger.info("Fetching stops for route %s", route)
 
-    if route not in LINE_TO_STOPS:
-        logger.warning(f"Route not found: {route}")
+    _, by_route = get_route_bodies()
+    body = by_route.get(route)
+    if body is None:
+        logger.warning("Route not found: %s", route)
         raise HTTPException(status_code=404, detail=f"Route {route} not found")
 
-    return RouteStopsResponse(stops=LINE_TO_STOPS[route])
+    return body.response(request)
 
 
-@app.get("/api/v1/arrivals/{route}/{station}", response_model=StationResponse)
-async def get_arrivals(route: str, station: str):
+def to_timestamp(at: datetime) -> int:
+    """Epoch seconds of a query time; times without a UTC offset are New York time"""
+    if at.tzinfo is None:
+        at = get_nyc_tz().localize(at)
+    return int(at.timestamp())
+
+
+def resolve_stop(route: str, station: str) -> str:
     """
-    Get upcoming train arrivals for a specific station and route.
-    Returns lists of upcoming downtown and uptown trains.
-    Parameters:
-    - route: Subway route (e.g., "4", "A", "Q")
-    - station: Station name (e.g., "Times Sq-42 St")
+    Look up the GTFS stop ID for a station on a route.
+    Raises a 404 HTTPException if the route or station is unknown.
     """
-    route = route.upper()
-    logger.info(f"Fetching arrivals for route {route} at station {station}")
-
     # Verify route exists
     if route not in URL_DICT:
-        logger.warning(f"Unsupported route requested: {route}")
+        logger.warning("Unsupported route requested: %s", route)
         raise HTTPException(
             status_code=404, detail=f"Route {route} not found or not supported"
         )
@@ -94,29 +286,357 @@ async def get_arrivals(route: str, station: str):
     stop_key = (station, route)
 
     if stop_key not in stops_dict:
-        logger.warning(f"Invalid station/route combination: {station} on {route}")
+        logger.warning("Invalid station/route combination: %s on %s", station, route)
         raise HTTPException(
             status_code=404, detail=f"Station '{station}' not found on route {route}"
         )
 
     gtfs_stop_id = stops_dict[stop_key]
-    logger.debug(f"Found GTFS stop ID: {gtfs_stop_id}")
+    logger.debug("Found GTFS stop ID: %s", gtfs_stop_id)
+    return gtfs_stop_id
+
+
+def encode_arrivals(arrivals: dict[str, str] | None) -> bytes:
+    """The arrivals response body"""
+    if not arrivals:
+        return NO_DATA_BODY
+    return StationResponse(**arrivals).model_dump_json().encode()
+
+
+@app.get("/api/v1/arrivals/{route}/{station}", response_model=StationResponse)
+async def get_arrivals(route: str, station: str, request: Request):
+    """
+    Get upcoming train arrivals for a specific station and route.
+    Returns lists of upcoming downtown and uptown trains.
+    Responses carry an ETag hashed from the body and a Last-Modified
+    from the feed timestamp, and If-None-Match is answered with 304.
+    The encoded response is cached for the feed generation, until the
+    clock moves a train out of the arrivals window.
+    Parameters:
+    - route: Subway route (e.g., "4", "A", "Q")
+    - station: Station name (e.g., "Times Sq-42 St")
+    """
+    route = route.upper()
+    logger.info("Fetching arrivals for route %s at station %s", route, station)
+    gtfs_stop_id = resolve_stop(route, station)
+    ARRIVAL_REQUESTS.labels(route).inc()
 
     # Get arrival times
     try:
-        arrivals = process_gtfs_data(route, gtfs_stop_id)
-        if not arrivals:
-            logger.info(f"No arrival data available for {station} on route {route}")
-            return StationResponse(downtowns="No data", uptowns="No data")
-        logger.debug(f"Arrivals found: {arrivals}")
-        return StationResponse(**arrivals)
+        snapshot = await get_feed_snapshot(route)
+        if snapshot is not None:
+            now = int(time.time())
+            cached = arrivals_cache.get(snapshot.generation, route, gtfs_stop_id, now)
+            if cached is None:
+                arrivals = arrivals_from_snapshot(snapshot, gtfs_stop_id, now=now)
+                if not arrivals:
+                    logger.info("No arrival data for %s on route %s", station, route)
+                body = encode_arrivals(arrivals)
+                expires_at = arrivals_change_at(snapshot, gtfs_stop_id, now)
+                arrivals_cache.put(snapshot, route, gtfs_stop_id, body, expires_at)
+            else:
+                body, expires_at = cached.body, cached.expires_at
+
+            # The body changes with the clock as well as the feed, so the
+            # ETag hashes the body and max-age stops when it would change
+            max_age = seconds_until_refresh(snapshot)
+            if expires_at is not None:
+                max_age = max(0, min(max_age, expires_at - now))
+            cache_headers = {
+                "ETag": f'"{body_digest(body)}"',
+                "Last-Modified": http_date(snapshot.generation),
+                "Cache-Control": f"public, max-age={max_age}",
+            }
+            if etag_matches(
+                request.headers.get("If-None-Match"), cache_headers["ETag"]
+            ):
+                logger.debug("Arrivals for %s on %s not modified", station, route)
+                return Response(status_code=304, headers=cache_headers)
+            return Response(body, media_type="application/json", headers=cache_headers)
+
+        logger.info("No arrival data available for %s on route %s", station, route)
+        return StationResponse(downtowns="No data", uptowns="No data")
     except Exception as e:
-        logger.error(f"Error fetching arrival times: {str(e)}", exc_info=True)
+        logger.error("Error fetching arrival times: %s", e, exc_info=True)
         raise HTTPException(
             status_code=500, detail=f"Error fetching arrival times: {str(e)}"
         )
 
 
+@app.get(
+    "/api/v1/history/arrivals/{route}/{station}",
+    response_model=HistoricalArrivalsResponse,
+)
+async def get_historical_arrivals(route: str, station: str, at: datetime):
+    """
+    Get the arrivals a station showed at a past time, from the feed archive.
+    Uses the latest archived feed at or before that time.
+    Parameters:
+    - route: Subway route (e.g., "4", "A", "Q")
+    - station: Station name (e.g., "Times Sq-42 St")
+    - at: ISO 8601 time; without a UTC offset it is New York time
+    """
+    if feed_archive is None:
+        raise HTTPException(status_code=503, detail="Feed archive is not enabled")
+    route = route.upper()
+    gtfs_stop_id = resolve_stop(route, station)
+    timestamp = to_timestamp(at)
+    logger.info("Fetching archived arrivals for %s on %s at %s", station, route, at)
+
+    snapshot = await get_archived_snapshot(route, timestamp)
+    if snapshot is None:
+        raise HTTPException(
+            status_code=404, detail=f"No archived feed for route {route} at {at}"
+        )
+    arrivals = arrivals_from_snapshot(snapshot, gtfs_stop_id, now=timestamp) or {
+        "downtowns": "No data",
+        "uptowns": "No data",
+    }
+    return HistoricalArrivalsResponse(
+        **arrivals,
+        snapshot_time=datetime.fromtimestamp(snapshot.fetched_at, timezone.utc),
+    )
+
+
+@app.get("/api/v1/analytics/headways/{route}")
+async def get_headway_analytics(
+    route: str,
+    start: datetime,
+    end: datetime,
+    station: str | None = None,
+    period: int | None = Query(None, ge=3600),
+):
+    """
+    Observed headways, average waits and prediction errors per station and
+    direction, computed from the feed archive between start and end.
+    Streams one JSON object per line for each period (default: the whole
+    range) and board, as soon as the period is complete.
+    Parameters:
+    - route: Subway route (e.g., "4", "A", "Q")
+    - start, end: ISO 8601 times; without a UTC offset they are New York time
+    - station: Only this station (e.g., "Times Sq-42 St")
+    - period: Seconds per reporting period, at least 3600
+    """
+    if feed_archive is None:
+        raise HTTPException(status_code=503, detail="Feed archive is not enabled")
+    route = route.upper()
+    if station is not None:
+        stop_ids = [resolve_stop(route, station)]
+    elif route in URL_DICT:
+        stop_ids = route_stop_ids(route)
+    else:
+        raise HTTPException(
+            status_code=404, detail=f"Route {route} not found or not supported"
+        )
+
+    start_ts, end_ts = to_timestamp(start), to_timestamp(end)
+    if not 0 < end_ts - start_ts <= MAX_ANALYTICS_RANGE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"end must be after start and at most {MAX_ANALYTICS_RANGE // 86400} "
+            "days later",
+        )
+
+    logger.info("Computing headways for route %s from %s to %s", route, start, end)
+    rows = headway_report(
+        feed_archive,
+        feed_label(URL_DICT[route]),
+        route,
+        stop_ids,
+        start_ts,
+        end_ts,
+        period or end_ts - start_ts,
+    )
+    return StreamingResponse(
+        (json.dumps(row) + "\n" for row in rows), media_type="application/x-ndjson"
+    )
+
+
+@app.post("/api/v1/arrivals/batch", response_model=BatchArrivalsResponse)
+async def get_arrivals_batch(request: BatchArrivalsRequest):
+    """
+    Get upcoming arrivals for many (route, station) pairs in one call.
+    Each feed is fetched at most once; a bad pair only fails its own item.
+    """
+    logger.info("Fetching batch arrivals for %s pairs", len(request.items))
+
+    results = [
+        BatchArrivalsItem(route=item.route.upper(), station=item.station)
+        for item in request.items
+    ]
+
+    # Group the valid pairs by feed URL
+    by_url: dict[str, list[tuple[BatchArrivalsItem, str]]] = defaultdict(list)
+    for result in results:
+        try:
+            gtfs_stop_id = resolve_stop(result.route, result.station)
+        except HTTPException as e:
+            result.error = e.detail
+            continue
+        ARRIVAL_REQUESTS.labels(result.route).inc()
+        by_url[URL_DICT[result.route]].append((result, gtfs_stop_id))
+
+    groups = list(by_url.values())
+    snapshots = await asyncio.gather(
+        *(get_url_snapshot(url) for url in by_url),
+        return_exceptions=True,
+    )
+
+    for group, snapshot in zip(groups, snapshots):
+        for result, gtfs_stop_id in group:
+            # BaseException: a cancelled fetch comes back as CancelledError
+            if isinstance(snapshot, BaseException):
+                result.error = f"Error fetching arrival times: {str(snapshot)}"
+                continue
+            arrivals = arrivals_from_snapshot(snapshot, gtfs_stop_id)
+            if arrivals:
+                result.arrivals = StationResponse(**arrivals)
+            else:
+                result.arrivals = StationResponse(
+                    downtowns="No data", uptowns="No data"
+                )
+
+    return BatchArrivalsResponse(results=results)
+
+
+@app.get("/api/v1/arrivals/stream")
+async def stream_arrivals_updates(subscribe: List[str] = Query(...)):
+    """
+    Stream arrival updates as Server-Sent Events.
+    Sends the current arrivals for each pair on connect, then an event
+    whenever a feed refresh changes them.
+    Parameters:
+    - subscribe: "route:station" pairs, repeatable (e.g., "4:Grand Central-42 St")
+    """
+    if not feed_poller.running:
+        raise HTTPException(status_code=503, detail="Feed poller is not running")
+    if len(stream_hub) >= stream_hub.max_subscribers:
+        logger.warning("Rejecting stream subscription, subscriber limit reached")
+        raise HTTPException(status_code=503, detail="Too many stream subscribers")
+    if len(subscribe) > MAX_PAIRS_PER_SUBSCRIBER:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_PAIRS_PER_SUBSCRIBER} pairs per subscription",
+        )
+
+    pairs = []
+    for item in subscribe:
+        route, sep, station = item.partition(":")
+        if not sep:
+            raise HTTPException(
+                status_code=400, detail=f"Expected 'route:station', got '{item}'"
+            )
+        route = route.upper()
+        pairs.append(StreamPair(route, station, resolve_stop(route, station)))
+
+    logger.info("Opening arrivals stream for %s pairs", len(pairs))
+    return StreamingResponse(
+        stream_arrivals(pairs),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/v1/board/{station}", response_model=StationBoardResponse)
+async def get_board(station: str):
+    """
+    Get a combined departure board for every route at a station complex.
+    Parameters:
+    - station: Station name (e.g., "Times Sq-42 St") or the station's Complex ID
+    """
+    logger.info("Fetching departure board for %s", station)
+
+    complex_ids = resolve_complex_ids(station)
+    if not complex_ids:
+        logger.warning("Station not found: %s", station)
+        raise HTTPException(status_code=404, detail=f"Station '{station}' not found")
+    if len(complex_ids) > 1:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Station '{station}' is ambiguous, use one of the Complex IDs "
+            f"{', '.join(complex_ids)}",
+        )
+
+    return await get_station_board(complex_ids[0])
+
+
+@app.get("/api/v1/stations/search", response_model=List[StationCandidate])
+async def search_stations(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+):
+    """
+    Fuzzy search for stations by name.
+    Returns ranked candidates with their Complex ID, GTFS stop IDs and routes.
+    """
+    logger.debug("Searching stations for '%s'", q)
+    return get_station_search_index().search(q, limit=limit)
+
+
+@app.get("/api/v1/stations/autocomplete", response_model=List[StationCompletion])
+async def autocomplete_stations(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(8, ge=1, le=10),
+):
+    """
+    Complete a partially typed station name.
+    Matches the start of any word in the name, spelled either abbreviated
+    or in full (e.g., "Sq" or "Square"); stations with more routes first.
+    """
+    return get_station_autocomplete().complete(q, limit=limit)
+
+
+@app.get("/api/v1/stations/nearby", response_model=List[NearbyStation])
+async def get_nearby_stations(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=20),
+    arrivals: bool = False,
+):
+    """
+    Get the k stops closest to a location, nearest first.
+    With arrivals=true, each stop also gets live arrivals per route.
+    """
+    logger.debug("Finding %s stations near (%s, %s)", k, lat, lon)
+    stations_dict = get_stations_dict()
+    results = []
+    for distance, stop_id in get_station_grid().nearest(lon, lat, k):
+        station = stations_dict[stop_id]
+        results.append(
+            NearbyStation(
+                stop_id=stop_id,
+                name=station.name,
+                complex_id=station.complex_id,
+                routes=list(station.routes),
+                distance_m=round(distance, 1),
+            )
+        )
+
+    if arrivals:
+        urls = list(
+            dict.fromkeys(
+                URL_DICT[route]
+                for result in results
+                for route in result.routes
+                if route in URL_DICT
+            )
+        )
+        snapshots = dict(zip(urls, await asyncio.gather(*map(get_url_snapshot, urls))))
+        for result in results:
+            result.arrivals = {}
+            for route in result.routes:
+                if route not in URL_DICT:
+                    continue
+                route_arrivals = arrivals_from_snapshot(
+                    snapshots[URL_DICT[route]], result.stop_id, route=route
+                )
+                result.arrivals[route] = StationResponse(
+                    **(route_arrivals or {"downtowns": "No data", "uptowns": "No data"})
+                )
+
+    return results
+
+
 @app.get("/api/v1/health")
 async def health_check():
     """
@@ -126,6 +646,22 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus metrics for this worker
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/api/v1/feeds")
+async def get_feed_status():
+    """
+    Age and poll status of each GTFS-RT feed snapshot held in memory
+    """
+    return {"poller_running": feed_poller.running, "feeds": feed_poller.status()}
+
+
 if __name__ == "__main__":
     import uvicorn
 
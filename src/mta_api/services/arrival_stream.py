@@ -0,0 +1,176 @@
+import asyncio
+import json
+import os
+import time
+from collections import defaultdict
+from typing import AsyncIterator, NamedTuple
+
+from mta_api.services.feed_decoder import NORTH, SOUTH
+from mta_api.services.feed_snapshot import FeedSnapshot
+from mta_api.services.train_service import (
+    URL_DICT,
+    arrivals_change_at,
+    arrivals_from_snapshot,
+    feed_poller,
+)
+from mta_api.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+MAX_SUBSCRIBERS = int(os.getenv("MTA_STREAM_MAX_SUBSCRIBERS", "5000"))
+MAX_PAIRS_PER_SUBSCRIBER = 20
+KEEPALIVE_INTERVAL = 15.0
+
+NO_DATA = {"downtowns": "No data", "uptowns": "No data"}
+
+
+class StreamPair(NamedTuple):
+    route: str
+    station: str
+    stop_id: str
+
+
+class Subscriber:
+    """
+    One streaming client. Only the latest arrivals per pair are kept, so
+    a slow client costs at most one pending board per subscribed pair.
+    """
+
+    def __init__(self, pairs: list[StreamPair]):
+        self.pairs = pairs
+        self.pending: dict[StreamPair, dict[str, str]] = {}
+        self.wakeup = asyncio.Event()
+
+    def push(self, pair: StreamPair, arrivals: dict[str, str]) -> None:
+        self.pending[pair] = arrivals
+        self.wakeup.set()
+
+    def drain(self) -> dict[StreamPair, dict[str, str]]:
+        pending, self.pending = self.pending, {}
+        self.wakeup.clear()
+        return pending
+
+
+class ArrivalStreamHub:
+    """
+    Fans feed refreshes out to streaming subscribers. Each refresh is
+    evaluated once per subscribed stop, and only subscribers whose
+    arrivals changed are woken. Stops whose boards the refresh didn't
+    touch are skipped until the clock alone would change their arrivals.
+    """
+
+    def __init__(self, max_subscribers: int = MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._subscribers: set[Subscriber] = set()
+        self._by_url: dict[str, dict[StreamPair, set[Subscriber]]] = defaultdict(dict)
+        self._last: dict[StreamPair, dict[str, str]] = {}
+        # When each (URL, stop)'s arrivals next change with the clock alone
+        self._change_at: dict[tuple[str, str], int | None] = {}
+        self._published: dict[str, float] = {}  # fetched_at of the last refresh
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, pairs: list[StreamPair]) -> Subscriber:
+        subscriber = Subscriber(pairs)
+        self._subscribers.add(subscriber)
+        for pair in pairs:
+            self._by_url[URL_DICT[pair.route]].setdefault(pair, set()).add(subscriber)
+            # Start the client off with the current board
+            snapshot = feed_poller.get(URL_DICT[pair.route])
+            if pair not in self._last and snapshot is not None:
+                self._last[pair] = (
+                    arrivals_from_snapshot(snapshot, pair.stop_id) or NO_DATA
+                )
+            if pair in self._last:
+                subscriber.push(pair, self._last[pair])
+        logger.debug("Subscriber added, %s connected", len(self._subscribers))
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+        for pair in subscriber.pairs:
+            pairs = self._by_url[URL_DICT[pair.route]]
+            subscribers = pairs.get(pair)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del pairs[pair]
+                self._last.pop(pair, None)
+                self._change_at.pop((URL_DICT[pair.route], pair.stop_id), None)
+        logger.debug("Subscriber removed, %s connected", len(self._subscribers))
+
+    def _unchanged(self, snapshot: FeedSnapshot, stop_id: str, now: int) -> bool:
+        """Whether stop's arrivals are as they were at the last refresh"""
+        changed = snapshot.changed_boards
+        if changed is None or snapshot.changed_since != self._published.get(
+            snapshot.url
+        ):
+            return False
+        if (stop_id, NORTH) in changed or (stop_id, SOUTH) in changed:
+            return False
+        change_at = self._change_at.get((snapshot.url, stop_id), 0)
+        return change_at is None or now < change_at
+
+    def publish(self, snapshot: FeedSnapshot) -> None:
+        """Poller listener: push changed arrivals for every pair on this feed"""
+        pairs = self._by_url.get(snapshot.url)
+        if not pairs:
+            self._published.pop(snapshot.url, None)
+            return
+
+        now = int(time.time())
+        by_stop: dict[str, dict[str, str]] = {}
+        changed = 0
+        for pair, subscribers in pairs.items():
+            arrivals = by_stop.get(pair.stop_id)
+            if arrivals is None:
+                if pair in self._last and self._unchanged(snapshot, pair.stop_id, now):
+                    continue
+                arrivals = (
+                    arrivals_from_snapshot(snapshot, pair.stop_id, now=now) or NO_DATA
+                )
+                by_stop[pair.stop_id] = arrivals
+                self._change_at[(snapshot.url, pair.stop_id)] = arrivals_change_at(
+                    snapshot, pair.stop_id, now
+                )
+            if self._last.get(pair) == arrivals:
+                continue
+            self._last[pair] = arrivals
+            changed += 1
+            for subscriber in subscribers:
+                subscriber.push(pair, arrivals)
+
+        self._published[snapshot.url] = snapshot.fetched_at
+        logger.debug(
+            "Feed %s refresh evaluated %s stops, changed %s streamed boards",
+            snapshot.url,
+            len(by_stop),
+            changed,
+        )
+
+
+stream_hub = ArrivalStreamHub()
+feed_poller.add_listener(stream_hub.publish)
+
+
+def format_event(pair: StreamPair, arrivals: dict[str, str]) -> str:
+    data = {"route": pair.route, "station": pair.station, **arrivals}
+    return f"event: arrivals\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_arrivals(pairs: list[StreamPair]) -> AsyncIterator[str]:
+    """Server-Sent Events for pairs until the client disconnects"""
+    subscriber = stream_hub.subscribe(pairs)
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(subscriber.wakeup.wait(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            for pair, arrivals in subscriber.drain().items():
+                yield format_event(pair, arrivals)
+    finally:
+        stream_hub.unsubscribe(subscriber)
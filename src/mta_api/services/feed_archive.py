@@ -0,0 +1,148 @@
+"""
+Append-only on-disk archive of raw GTFS-RT payloads.
+
+Each feed group gets one pair of files per UTC day under the archive
+directory: <group>/<day>.data holds the zlib-compressed payloads back to
+back, and <group>/<day>.idx holds one fixed-size (timestamp, offset,
+length) record per payload, in timestamp order. Lookups memory-map the
+index and binary search it, then read just the one payload they need.
+The index record is written after its payload, so a crash can leave
+unreferenced bytes at the end of a data file but never a dangling record.
+"""
+
+import fcntl
+import mmap
+import os
+import time
+import zlib
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+from mta_api.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Empty disables archiving
+ARCHIVE_DIR = os.getenv("MTA_FEED_ARCHIVE_DIR", "")
+COMPRESSION_LEVEL = 6
+DAY_SECONDS = 24 * 60 * 60
+
+INDEX_ENTRY = np.dtype([("timestamp", "<i8"), ("offset", "<u8"), ("length", "<u4")])
+
+
+def day_of(timestamp: int) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(timestamp))
+
+
+def last_entry(index_file) -> np.void | None:
+    """The last complete record of an open index file"""
+    count = os.fstat(index_file.fileno()).st_size // INDEX_ENTRY.itemsize
+    if count == 0:
+        return None
+    record = os.pread(
+        index_file.fileno(),
+        INDEX_ENTRY.itemsize,
+        (count - 1) * INDEX_ENTRY.itemsize,
+    )
+    return np.frombuffer(record, dtype=INDEX_ENTRY)[0]
+
+
+class FeedArchive:
+    def __init__(self, root: Path, level: int = COMPRESSION_LEVEL):
+        self.root = Path(root)
+        self.level = level
+        self._last_timestamps: dict[str, int] = {}
+
+    def _paths(self, group: str, day: str) -> tuple[Path, Path]:
+        base = self.root / group / day
+        return base.with_suffix(".data"), base.with_suffix(".idx")
+
+    def _index(self, group: str, day: str) -> np.ndarray:
+        """
+        The day's index records as an array over a read-only mmap of the
+        file; the mapping is released with the array
+        """
+        _, index_path = self._paths(group, day)
+        try:
+            with open(index_path, "rb") as f:
+                # Ignore a partially written trailing record
+                count = os.fstat(f.fileno()).st_size // INDEX_ENTRY.itemsize
+                if count == 0:
+                    return np.empty(0, dtype=INDEX_ENTRY)
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return np.empty(0, dtype=INDEX_ENTRY)
+        return np.frombuffer(mapped, dtype=INDEX_ENTRY, count=count)
+
+    def append(self, group: str, timestamp: int, payload: bytes) -> bool:
+        """
+        Archive one payload of group, stamped with its feed timestamp.
+        Payloads not newer than the last one archived are skipped.
+        """
+        if timestamp <= self._last_timestamps.get(group, 0):
+            return False
+        day = day_of(timestamp)
+
+        data_path, index_path = self._paths(group, day)
+        data_path.parent.mkdir(parents=True, exist_ok=True)
+        compressed = zlib.compress(payload, self.level)
+        with open(index_path, "a+b") as index_file, open(data_path, "ab") as data_file:
+            # Serializes writers when several workers archive the same feed
+            fcntl.flock(index_file, fcntl.LOCK_EX)
+            try:
+                last = last_entry(index_file)
+                if last is not None and timestamp <= last["timestamp"]:
+                    self._last_timestamps[group] = int(last["timestamp"])
+                    return False
+                offset = data_file.seek(0, os.SEEK_END)
+                data_file.write(compressed)
+                data_file.flush()
+                entry = np.array([(timestamp, offset, len(compressed))], INDEX_ENTRY)
+                index_file.write(entry.tobytes())
+                index_file.flush()
+            finally:
+                fcntl.flock(index_file, fcntl.LOCK_UN)
+
+        self._last_timestamps[group] = timestamp
+        logger.debug(
+            "Archived %s payload at %s (%s -> %s bytes)",
+            group,
+            timestamp,
+            len(payload),
+            len(compressed),
+        )
+        return True
+
+    def _read_payload(self, group: str, day: str, offset: int, length: int) -> bytes:
+        data_path, _ = self._paths(group, day)
+        with open(data_path, "rb") as f:
+            f.seek(offset)
+            return zlib.decompress(f.read(length))
+
+    def lookup(self, group: str, timestamp: int) -> tuple[int, bytes] | None:
+        """The latest payload of group at or before timestamp, with its timestamp"""
+        # The day before covers lookups early in a day
+        for day in (day_of(timestamp), day_of(timestamp - DAY_SECONDS)):
+            index = self._index(group, day)
+            position = np.searchsorted(index["timestamp"], timestamp, side="right")
+            if position > 0:
+                found, offset, length = index[position - 1].item()
+                return found, self._read_payload(group, day, offset, length)
+        return None
+
+    def scan(self, group: str, start: int, end: int) -> Iterator[tuple[int, bytes]]:
+        """Every payload of group stamped in [start, end), oldest first"""
+        day_start = start - start % DAY_SECONDS
+        for day_timestamp in range(day_start, end, DAY_SECONDS):
+            day = day_of(day_timestamp)
+            index = self._index(group, day)
+            lo, hi = np.searchsorted(index["timestamp"], [start, end])
+            entries = index[lo:hi].tolist()
+            del index
+            for timestamp, offset, length in entries:
+                yield timestamp, self._read_payload(group, day, offset, length)
+
+
+feed_archive = FeedArchive(Path(ARCHIVE_DIR)) if ARCHIVE_DIR else None
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from mta_api.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+# MTA refreshes the GTFS-RT feeds roughly every 30 seconds
+FEED_CACHE_TTL = float(os.getenv("MTA_FEED_CACHE_TTL", "30"))
+
+
+class FeedCache(Generic[T]):
+    """
+    TTL cache of parsed feeds keyed by feed URL.
+    Concurrent misses for the same URL are coalesced into a single fetch,
+    and every waiter gets the same parsed object back.
+    """
+
+    def __init__(
+        self,
+        fetcher: Callable[[str], Awaitable[T | None]],
+        ttl: float = FEED_CACHE_TTL,
+    ):
+        self._fetcher = fetcher
+        self.ttl = ttl
+        self._entries: dict[str, tuple[float, T]] = {}
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _fresh(self, url: str) -> T | None:
+        entry = self._entries.get(url)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+        return None
+
+    async def get(self, url: str) -> T | None:
+        """Return the cached feed for url, fetching it if missing or expired."""
+        feed = self._fresh(url)
+        if feed is not None:
+            self.hits += 1
+            return feed
+
+        inflight = self._inflight.get(url)
+        if inflight is not None:
+            self.coalesced += 1
+            logger.debug("Joining in-flight fetch for %s", url)
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        # The fetch runs in its own task, so a cancelled caller (e.g. a client
+        # that disconnected) doesn't cancel it for the callers it coalesced
+        task = asyncio.create_task(self._fetch(url))
+        # Retrieve a failure even if every caller has gone
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[url] = task
+        return await asyncio.shield(task)
+
+    async def _fetch(self, url: str) -> T | None:
+        try:
+            feed = await self._fetcher(url)
+            if feed is not None:
+                self._entries[url] = (time.monotonic(), feed)
+            return feed
+        finally:
+            del self._inflight[url]
+
+    def stats(self) -> dict[str, int]:
+        """Lookup counts: served from cache, fetched, or joined a pending fetch"""
+        return {"hit": self.hits, "miss": self.misses, "coalesced": self.coalesced}
+
+    def invalidate(self, url: str | None = None) -> None:
+        """Drop the cached feed for url, or every feed if url is None."""
+        if url is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(url, None)
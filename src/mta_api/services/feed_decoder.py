@@ -0,0 +1,188 @@
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Sequence
+
+import numpy as np
+
+from mta_api.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+NORTH = "N"
+SOUTH = "S"
+DIRECTIONS = (NORTH, SOUTH)  # position is the direction code
+
+
+def split_stop_id(stop_id: str) -> tuple[str, str]:
+    """Split a feed stop ID like "127N" into ("127", "N")"""
+    if stop_id.endswith(NORTH):
+        return stop_id[:-1], NORTH
+    if stop_id.endswith(SOUTH):
+        return stop_id[:-1], SOUTH
+    return stop_id, SOUTH
+
+
+@dataclass(frozen=True)
+class FeedColumns:
+    """
+    Every stop_time_update with an arrival in a feed, one row per update.
+    Stops, routes and trips are interned: the arrays hold positions into
+    the matching ID lists.
+    """
+
+    stop_ids: list[str]
+    route_ids: list[str]
+    trip_ids: list[str]
+    stop: np.ndarray  # int32 index into stop_ids
+    direction: np.ndarray  # uint8 index into DIRECTIONS
+    route: np.ndarray  # int16 index into route_ids
+    trip: np.ndarray  # int32 index into trip_ids
+    arrival: np.ndarray  # int64 epoch seconds
+    skipped: int = 0  # decoded stop_time_updates without an arrival
+    reused: int = 0  # rows carried over from the previous feed's columns
+
+    def __len__(self) -> int:
+        return len(self.arrival)
+
+    def board_keys(self, rows: np.ndarray | slice = slice(None)) -> np.ndarray:
+        """stop * 2 + direction of rows, one key per (stop, direction) board"""
+        return self.stop[rows].astype(np.int64) * 2 + self.direction[rows]
+
+
+class _RowBuilder:
+    """Accumulates the rows of trip updates, interning on top of known IDs"""
+
+    def __init__(self, stop_ids: Sequence[str] = (), route_ids: Sequence[str] = ()):
+        self.stop_codes = {stop_id: i for i, stop_id in enumerate(stop_ids)}
+        self.route_codes = {route_id: i for i, route_id in enumerate(route_ids)}
+        self.trip_ids: list[str] = []
+        self.stops: list[int] = []
+        self.directions: list[int] = []
+        self.routes: list[int] = []
+        self.trips: list[int] = []
+        self.arrivals: list[int] = []
+        self.skipped = 0
+
+    def add(self, trip_update) -> None:
+        stop_codes = self.stop_codes
+        route = self.route_codes.setdefault(
+            trip_update.trip.route_id, len(self.route_codes)
+        )
+        trip = len(self.trip_ids)
+        self.trip_ids.append(trip_update.trip.trip_id)
+
+        stops, directions = self.stops, self.directions
+        routes, trips, arrivals = self.routes, self.trips, self.arrivals
+        for stop_time_update in trip_update.stop_time_update:
+            if not stop_time_update.HasField("arrival"):
+                self.skipped += 1
+                continue
+            stop_id, direction = split_stop_id(stop_time_update.stop_id)
+            stops.append(stop_codes.setdefault(stop_id, len(stop_codes)))
+            directions.append(direction == SOUTH)
+            routes.append(route)
+            trips.append(trip)
+            arrivals.append(stop_time_update.arrival.time)
+
+    def columns(self) -> FeedColumns:
+        return FeedColumns(
+            stop_ids=list(self.stop_codes),
+            route_ids=list(self.route_codes),
+            trip_ids=self.trip_ids,
+            stop=np.array(self.stops, dtype=np.int32),
+            direction=np.array(self.directions, dtype=np.uint8),
+            route=np.array(self.routes, dtype=np.int16),
+            trip=np.array(self.trips, dtype=np.int32),
+            arrival=np.array(self.arrivals, dtype=np.int64),
+            skipped=self.skipped,
+        )
+
+
+def decode_feed(feed) -> FeedColumns:
+    """Flatten the trip updates of a FeedMessage into FeedColumns"""
+    builder = _RowBuilder()
+    for entity in feed.entity:
+        if entity.HasField("trip_update"):
+            builder.add(entity.trip_update)
+
+    columns = builder.columns()
+    logger.debug(
+        "Decoded %s arrivals for %s trips at %s stops",
+        len(columns),
+        len(columns.trip_ids),
+        len(columns.stop_ids),
+    )
+    return columns
+
+
+def _trip_updates(feed) -> dict[str, Any]:
+    """The trip updates of feed by trip ID, leaving out IDs that repeat"""
+    updates = {}
+    repeated = set()
+    for entity in feed.entity:
+        if entity.HasField("trip_update"):
+            trip_id = entity.trip_update.trip.trip_id
+            if trip_id in updates:
+                repeated.add(trip_id)
+            updates[trip_id] = entity.trip_update
+    for trip_id in repeated:
+        del updates[trip_id]
+    return updates
+
+
+def decode_feed_changes(
+    feed, previous_feed, previous: FeedColumns
+) -> tuple[FeedColumns, frozenset[tuple[str, str]]]:
+    """
+    Decode feed given previous, the columns of previous_feed. Trips whose
+    update is unchanged keep their previous rows and only new or changed
+    trips are decoded. Also returns the (stop ID, direction) boards that
+    gained or lost rows.
+    """
+    previous_updates = _trip_updates(previous_feed)
+    previous_codes = {trip_id: i for i, trip_id in enumerate(previous.trip_ids)}
+    updates = [
+        entity.trip_update for entity in feed.entity if entity.HasField("trip_update")
+    ]
+    trip_ids = [trip_update.trip.trip_id for trip_update in updates]
+    repeated = {trip_id for trip_id, n in Counter(trip_ids).items() if n > 1}
+    builder = _RowBuilder(previous.stop_ids, previous.route_ids)
+    reused: list[int] = []  # previous trip codes, in feed order
+
+    for trip_id, trip_update in zip(trip_ids, updates):
+        if trip_id not in repeated and previous_updates.get(trip_id) == trip_update:
+            reused.append(previous_codes[trip_id])
+        else:
+            builder.add(trip_update)
+    added = builder.columns()
+
+    trip_codes = np.full(len(previous.trip_ids), -1, dtype=np.int32)
+    trip_codes[reused] = np.arange(len(reused), dtype=np.int32)
+    kept = trip_codes[previous.trip] >= 0
+    columns = FeedColumns(
+        stop_ids=added.stop_ids,
+        route_ids=added.route_ids,
+        trip_ids=[previous.trip_ids[code] for code in reused] + added.trip_ids,
+        stop=np.concatenate((previous.stop[kept], added.stop)),
+        direction=np.concatenate((previous.direction[kept], added.direction)),
+        route=np.concatenate((previous.route[kept], added.route)),
+        trip=np.concatenate(
+            (trip_codes[previous.trip[kept]], added.trip + np.int32(len(reused)))
+        ),
+        arrival=np.concatenate((previous.arrival[kept], added.arrival)),
+        skipped=added.skipped,
+        reused=int(kept.sum()),
+    )
+
+    keys = np.union1d(previous.board_keys(~kept), added.board_keys())
+    changed = frozenset(
+        (columns.stop_ids[key // 2], DIRECTIONS[key % 2]) for key in keys.tolist()
+    )
+    logger.debug(
+        "Decoded %s of %s trips (%s arrivals reused), %s boards changed",
+        len(added.trip_ids),
+        len(columns.trip_ids),
+        columns.reused,
+        len(changed),
+    )
+    return columns, changed
@@ -0,0 +1,112 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Iterable
+
+from mta_api.services.feed_snapshot import FeedSnapshot
+from mta_api.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+POLL_INTERVAL = float(os.getenv("MTA_FEED_POLL_INTERVAL", "15"))
+MAX_BACKOFF = 120.0
+
+
+class FeedPoller:
+    """
+    Polls each feed URL on its own asyncio task and publishes the latest
+    snapshot in memory. A failed poll keeps the previous snapshot.
+    """
+
+    def __init__(
+        self,
+        urls: Iterable[str],
+        fetcher: Callable[[str], Awaitable[FeedSnapshot | None]],
+        interval: float = POLL_INTERVAL,
+    ):
+        self.urls = sorted(set(urls))
+        self.interval = interval
+        self._fetcher = fetcher
+        self._snapshots: dict[str, FeedSnapshot] = {}
+        self._failures: dict[str, int] = {}
+        self._last_error: dict[str, str] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._listeners: list[Callable[[FeedSnapshot], None]] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def get(self, url: str) -> FeedSnapshot | None:
+        return self._snapshots.get(url)
+
+    def add_listener(self, listener: Callable[[FeedSnapshot], None]) -> None:
+        """Call listener with every newly published snapshot"""
+        self._listeners.append(listener)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        logger.info("Starting feed poller for %s feeds", len(self.urls))
+        # Stagger the first polls so the feeds don't all refresh in lockstep
+        step = self.interval / max(len(self.urls), 1)
+        self._tasks = [
+            asyncio.create_task(self._poll_forever(url, delay=i * step))
+            for i, url in enumerate(self.urls)
+        ]
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info("Feed poller stopped")
+
+    async def poll(self, url: str) -> bool:
+        """Fetch url once, publishing the result. Returns whether it succeeded."""
+        try:
+            snapshot = await self._fetcher(url)
+            error = "fetch failed"
+        except Exception as e:
+            snapshot = None
+            error = str(e)
+            logger.error("Error polling feed %s: %s", url, error)
+
+        if snapshot is None:
+            self._failures[url] = self._failures.get(url, 0) + 1
+            self._last_error[url] = error
+            return False
+
+        # Swapping in the new snapshot object is atomic for readers
+        self._snapshots[url] = snapshot
+        self._failures[url] = 0
+        self._last_error.pop(url, None)
+
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.error("Feed listener failed for %s: %s", url, e, exc_info=True)
+        return True
+
+    async def _poll_forever(self, url: str, delay: float = 0.0) -> None:
+        await asyncio.sleep(delay)
+        while True:
+            ok = await self.poll(url)
+            if ok:
+                wait = self.interval
+            else:
+                wait = min(self.interval * 2 ** self._failures[url], MAX_BACKOFF)
+                logger.warning("Poll of %s failed, retrying in %.0fs", url, wait)
+            await asyncio.sleep(wait)
+
+    def status(self) -> dict[str, dict[str, Any]]:
+        """Per-feed snapshot age and failure state."""
+        result = {}
+        for url in self.urls:
+            snapshot = self._snapshots.get(url)
+            result[url] = {
+                "age_seconds": round(snapshot.age, 1) if snapshot else None,
+                "consecutive_failures": self._failures.get(url, 0),
+                "last_error": self._last_error.get(url),
+            }
+        return result
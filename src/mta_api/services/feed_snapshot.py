@@ -0,0 +1,205 @@
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+
+from mta_api.services.feed_decoder import (
+    DIRECTIONS,
+    FeedColumns,
+    decode_feed,
+    decode_feed_changes,
+)
+from mta_api.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ArrivalsIndex:
+    """
+    Upcoming arrivals of one feed snapshot, keyed by (GTFS stop ID, direction).
+    The decoded columns are sorted by stop, direction and arrival time, so
+    each board is a contiguous, time-sorted slice and a time window within
+    it is found by binary search.
+    """
+
+    def __init__(self, columns: FeedColumns):
+        order = np.lexsort((columns.arrival, columns.direction, columns.stop))
+        board_keys = columns.board_keys(order)
+        bounds = np.flatnonzero(np.diff(board_keys)) + 1
+        starts = np.concatenate(([0], bounds)).tolist()
+        ends = np.concatenate((bounds, [len(board_keys)])).tolist()
+
+        boards: dict[tuple[str, str], tuple[int, int]] = {}
+        if len(board_keys):
+            for key, lo, hi in zip(board_keys[starts].tolist(), starts, ends):
+                stop_id = columns.stop_ids[key // 2]
+                boards[(stop_id, DIRECTIONS[key % 2])] = (lo, hi)
+
+        self._assign(
+            columns.route_ids, columns.arrival[order], columns.route[order], boards
+        )
+        self.columns: FeedColumns | None = columns
+        logger.debug(
+            "Indexed %s arrivals over %s stop boards", len(order), len(self._boards)
+        )
+
+    def _assign(
+        self,
+        route_ids: list[str],
+        arrival: np.ndarray,
+        route: np.ndarray,
+        boards: dict[tuple[str, str], tuple[int, int]],
+    ) -> None:
+        self.route_ids = route_ids
+        self._route_codes = {route: i for i, route in enumerate(route_ids)}
+        self._arrival = arrival
+        self._route = route
+        self._boards = boards
+
+    @classmethod
+    def from_feed(cls, feed) -> "ArrivalsIndex":
+        return cls(decode_feed(feed))
+
+    @classmethod
+    def from_arrays(
+        cls,
+        route_ids: list[str],
+        arrival: np.ndarray,
+        route: np.ndarray,
+        boards: dict[tuple[str, str], tuple[int, int]],
+    ) -> "ArrivalsIndex":
+        """
+        An index over arrays already sorted by board, as returned by
+        arrays(). They are used as they are, e.g. straight from a mapping
+        of shared memory, and there are no columns.
+        """
+        index = cls.__new__(cls)
+        index._assign(route_ids, arrival, route, boards)
+        index.columns = None
+        return index
+
+    def arrays(
+        self,
+    ) -> tuple[np.ndarray, np.ndarray, dict[tuple[str, str], tuple[int, int]]]:
+        """The sorted arrival times and route codes, and the bounds of each board"""
+        return self._arrival, self._route, self._boards
+
+    def __len__(self) -> int:
+        return len(self._boards)
+
+    def upcoming(
+        self,
+        stop_id: str,
+        direction: str,
+        start: int,
+        end: int,
+        limit: int | None = None,
+        route: str | None = None,
+    ) -> list[tuple[int, str]]:
+        """
+        Arrivals at stop_id heading in direction between start and end
+        (inclusive, epoch seconds), earliest first.
+        """
+        board = self._boards.get((stop_id, direction))
+        if board is None:
+            return []
+
+        lo, hi = board
+        times = self._arrival[lo:hi]
+        first = lo + int(np.searchsorted(times, start, side="left"))
+        last = lo + int(np.searchsorted(times, end, side="right"))
+
+        rows: slice | np.ndarray
+        if route is None:
+            rows = slice(first, last if limit is None else min(last, first + limit))
+        else:
+            code = self._route_codes.get(route)
+            if code is None:
+                return []
+            rows = first + np.flatnonzero(self._route[first:last] == code)[:limit]
+
+        return [
+            (t, self.route_ids[r])
+            for t, r in zip(self._arrival[rows].tolist(), self._route[rows].tolist())
+        ]
+
+    def changes_at(
+        self, stop_id: str, direction: str, start: int, end: int, limit: int
+    ) -> int | None:
+        """
+        The earliest start at which upcoming(stop_id, direction, start, end,
+        limit), with the window slid forward, gives a different answer:
+        when the first arrival shown leaves the window or another enters it.
+        None if the answer never changes.
+        """
+        board = self._boards.get((stop_id, direction))
+        if board is None:
+            return None
+
+        lo, hi = board
+        times = self._arrival[lo:hi]
+        first = int(np.searchsorted(times, start, side="left"))
+        last = int(np.searchsorted(times, end, side="right"))
+        candidates = []
+        if first < last:
+            candidates.append(int(times[first]) + 1)
+        if last < len(times) and last - first < limit:
+            candidates.append(start + int(times[last]) - end)
+        return min(candidates, default=None)
+
+
+@dataclass(frozen=True)
+class FeedSnapshot:
+    """
+    A parsed feed together with the arrivals index built from it. Snapshots
+    read from shared memory carry only the index, and feed is None.
+    changed_boards holds the (GTFS stop ID, direction) boards that changed
+    since the snapshot fetched at changed_since; None if not known.
+    """
+
+    url: str
+    feed: Any
+    index: ArrivalsIndex
+    fetched_at: float = field(default_factory=time.time)
+    timestamp: int = 0  # feed header timestamp
+    changed_boards: frozenset[tuple[str, str]] | None = None
+    changed_since: float | None = None
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    @property
+    def generation(self) -> int:
+        """The feed header timestamp, i.e. when the MTA last changed the data"""
+        return self.timestamp or int(self.fetched_at)
+
+    @classmethod
+    def from_feed(
+        cls, url: str, feed, previous: "FeedSnapshot | None" = None
+    ) -> "FeedSnapshot":
+        """
+        Snapshot of feed. Given the previous snapshot of the same URL, only
+        the trips that changed since are decoded; unless that one came from
+        shared memory, without a feed or columns to compare against.
+        """
+        if previous is None or previous.feed is None or previous.index.columns is None:
+            return cls(
+                url=url,
+                feed=feed,
+                index=ArrivalsIndex.from_feed(feed),
+                timestamp=feed.header.timestamp,
+            )
+
+        columns, changed = decode_feed_changes(
+            feed, previous.feed, previous.index.columns
+        )
+        return cls(
+            url=url,
+            feed=feed,
+            index=ArrivalsIndex(columns),
+            timestamp=feed.header.timestamp,
+            changed_boards=changed,
+            changed_since=previous.fetched_at,
+        )
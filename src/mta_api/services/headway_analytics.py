@@ -0,0 +1,300 @@
+"""
+Headway and prediction-reliability analytics over the feed archive.
+
+A route's archived snapshots are decoded in order and every (trip, stop)
+prediction is kept until the stop is settled: no longer in the latest
+snapshot and its last predicted arrival PREDICTION_SETTLE seconds in the
+past. The last prediction is then taken as the observed arrival, and the
+earlier ones are scored against it. Snapshots are processed in chunks
+with numpy, so memory stays bounded by the trips in flight and the
+per-board accumulators, however long the range. Results are yielded per
+period as soon as every arrival in the period has settled.
+"""
+
+from datetime import datetime, timezone
+from typing import Iterator
+
+import numpy as np
+
+from mta_api.data.station_parser import get_stations_dict
+from mta_api.services.feed_archive import FeedArchive
+from mta_api.services.feed_decoder import DIRECTIONS, FeedColumns, decode_feed
+from mta_api.services.train_service import ARRIVALS_WINDOW, new_feed_message
+from mta_api.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+PREDICTION_SETTLE = 5 * 60  # seconds
+CHUNK_SNAPSHOTS = 120  # an hour of snapshots at a 30 second refresh
+LEAD_EDGES = np.array([0, 5, 10, 20, 30]) * 60  # prediction lead time buckets
+HEADWAY_EDGES = np.arange(0, 60 * 60 + 1, 30)
+ERROR_EDGES = np.arange(-10 * 60, 10 * 60 + 1, 30)
+
+
+def _histogram_quantile(counts: np.ndarray, edges: np.ndarray, q: float) -> float:
+    """Approximate quantile of binned values, using the containing bin's middle"""
+    cumulative = np.cumsum(counts)
+    position = int(np.searchsorted(cumulative, q * cumulative[-1]))
+    return float((edges[position] + edges[position + 1]) / 2)
+
+
+def _bins(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Bin positions of values, clipping outliers into the end bins"""
+    return np.clip(np.searchsorted(edges, values, side="right") - 1, 0, len(edges) - 2)
+
+
+class PeriodStats:
+    """Accumulators for every board of one reporting period"""
+
+    def __init__(self, boards: int):
+        leads = len(LEAD_EDGES) - 1
+        self.trains = np.zeros(boards, np.int64)
+        self.headway_sum = np.zeros(boards, np.float64)
+        self.headway_sq = np.zeros(boards, np.float64)
+        self.headways = np.zeros((boards, len(HEADWAY_EDGES) - 1), np.int64)
+        self.error_sum = np.zeros((boards, leads), np.float64)
+        self.errors = np.zeros((boards, leads, len(ERROR_EDGES) - 1), np.int64)
+
+
+class HeadwayAnalyzer:
+    """Turns a route's snapshots, oldest first, into per-period board stats"""
+
+    def __init__(
+        self, route: str, stop_ids: list[str], start: int, end: int, period: int
+    ):
+        self.route = route
+        self.stop_ids = stop_ids
+        self.start = start
+        self.end = end
+        self.period = period
+        self._stop_codes = {stop_id: i for i, stop_id in enumerate(stop_ids)}
+        self._boards = len(stop_ids) * len(DIRECTIONS)
+        self._trip_codes: dict[str, int] = {}
+        self._last_arrival = np.full(self._boards, -1, np.int64)
+        self._periods: dict[int, PeriodStats] = {}
+        self._emitted = 0  # periods before this one have been yielded
+        # Observations not yet settled: key, snapshot time, predicted arrival
+        self._pending = (np.empty(0, np.int64),) * 3
+        self._chunk: list[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        self._latest = 0
+
+    def add(self, timestamp: int, columns: FeedColumns) -> None:
+        if self.route not in columns.route_ids:
+            return
+        stop_codes = np.array(
+            [self._stop_codes.get(stop_id, -1) for stop_id in columns.stop_ids],
+            np.int64,
+        )
+        stops = stop_codes[columns.stop]
+        keep = (columns.route == columns.route_ids.index(self.route)) & (stops >= 0)
+        if not keep.any():
+            return
+
+        trip_codes = np.array(
+            [
+                self._trip_codes.setdefault(trip_id, len(self._trip_codes))
+                for trip_id in columns.trip_ids
+            ],
+            np.int64,
+        )
+        boards = stops[keep] * len(DIRECTIONS) + columns.direction[keep]
+        keys = trip_codes[columns.trip[keep]] * self._boards + boards
+        predicted = columns.arrival[keep]
+        self._chunk.append((keys, np.full(len(keys), timestamp, np.int64), predicted))
+        self._latest = timestamp
+
+    def process(self, final: bool = False) -> Iterator[dict]:
+        """Settle what the snapshots so far allow and yield finished periods"""
+        keys, seen, predicted = (
+            np.concatenate([pending, *parts])
+            for pending, *parts in zip(self._pending, *self._chunk)
+        )
+        self._chunk = []
+        if len(keys):
+            order = np.lexsort((seen, keys))
+            keys, seen, predicted = keys[order], seen[order], predicted[order]
+            # Last observation of each key
+            is_last = np.append(keys[1:] != keys[:-1], True)
+            group = np.cumsum(np.append(True, is_last[:-1])) - 1
+            last_seen = seen[is_last]
+            arrival = predicted[is_last]
+            settled = (last_seen < self._latest) & (
+                arrival < self._latest - PREDICTION_SETTLE
+            )
+            if final:
+                settled[:] = True
+
+            boards = keys[is_last] % self._boards
+            self._record_arrivals(boards[settled], arrival[settled])
+
+            observation_settled = settled[group]
+            scored = observation_settled & ~is_last
+            self._record_errors(
+                boards[group[scored]],
+                arrival[group[scored]],
+                seen[scored],
+                predicted[scored],
+            )
+            self._pending = (
+                keys[~observation_settled],
+                seen[~observation_settled],
+                predicted[~observation_settled],
+            )
+
+        yield from self._emit(final)
+
+    def _period_of(self, times: np.ndarray) -> np.ndarray:
+        return (times - self.start) // self.period
+
+    def _stats(self, period: int) -> PeriodStats:
+        if period not in self._periods:
+            self._periods[period] = PeriodStats(self._boards)
+        return self._periods[period]
+
+    def _record_arrivals(self, boards: np.ndarray, times: np.ndarray) -> None:
+        order = np.lexsort((times, boards))
+        boards, times = boards[order], times[order]
+        first = np.append(True, boards[1:] != boards[:-1])
+        previous = np.where(first, self._last_arrival[boards], np.roll(times, 1))
+        np.maximum.at(self._last_arrival, boards, times)
+
+        in_range = (times >= self.start) & (times < self.end)
+        headway = times - previous
+        # Drop the first train ever seen and duplicate or out-of-order ones
+        has_headway = in_range & (previous >= 0) & (headway > 0)
+        periods = self._period_of(times)
+        for period in np.unique(periods[in_range]):
+            stats = self._stats(int(period))
+            mask = in_range & (periods == period)
+            np.add.at(stats.trains, boards[mask], 1)
+            mask &= has_headway
+            h = headway[mask].astype(np.float64)
+            np.add.at(stats.headway_sum, boards[mask], h)
+            np.add.at(stats.headway_sq, boards[mask], h * h)
+            np.add.at(stats.headways, (boards[mask], _bins(h, HEADWAY_EDGES)), 1)
+
+    def _record_errors(
+        self,
+        boards: np.ndarray,
+        arrivals: np.ndarray,
+        seen: np.ndarray,
+        predicted: np.ndarray,
+    ) -> None:
+        lead = predicted - seen
+        in_range = (
+            (arrivals >= self.start)
+            & (arrivals < self.end)
+            & (lead >= 0)
+            & (lead < LEAD_EDGES[-1])
+        )
+        lead_bins = np.searchsorted(LEAD_EDGES, lead, side="right") - 1
+        error = (predicted - arrivals).astype(np.float64)
+        periods = self._period_of(arrivals)
+        for period in np.unique(periods[in_range]):
+            stats = self._stats(int(period))
+            mask = in_range & (periods == period)
+            index = (boards[mask], lead_bins[mask])
+            np.add.at(stats.error_sum, index, error[mask])
+            np.add.at(stats.errors, (*index, _bins(error[mask], ERROR_EDGES)), 1)
+
+    def _emit(self, final: bool) -> Iterator[dict]:
+        periods = -(-(self.end - self.start) // self.period)
+        # Allow for trains that stay in the feed a while after arriving
+        settled_until = self._latest - 2 * PREDICTION_SETTLE
+        done = periods if final else (settled_until - self.start) // self.period
+        while self._emitted < min(done, periods):
+            stats = self._periods.pop(self._emitted, None)
+            if stats is not None:
+                yield from self._rows(self._emitted, stats)
+            self._emitted += 1
+
+    def _rows(self, period: int, stats: PeriodStats) -> Iterator[dict]:
+        stations = get_stations_dict()
+        period_start = self.start + period * self.period
+        period_end = min(period_start + self.period, self.end)
+        for board in np.flatnonzero(stats.trains):
+            stop_id = self.stop_ids[board // len(DIRECTIONS)]
+            station = stations.get(stop_id)
+            headway_count = int(stats.headways[board].sum())
+            row = {
+                "period_start": _isoformat(period_start),
+                "period_end": _isoformat(period_end),
+                "route": self.route,
+                "stop_id": stop_id,
+                "station": station.name if station else None,
+                "direction": DIRECTIONS[board % len(DIRECTIONS)],
+                "trains": int(stats.trains[board]),
+                "headway_seconds": None,
+                "average_wait_seconds": None,
+                "prediction_error_seconds": [],
+            }
+            if headway_count:
+                counts = stats.headways[board]
+                row["headway_seconds"] = {
+                    "mean": round(stats.headway_sum[board] / headway_count, 1),
+                    "median": _histogram_quantile(counts, HEADWAY_EDGES, 0.5),
+                    "p90": _histogram_quantile(counts, HEADWAY_EDGES, 0.9),
+                }
+                # Expected wait of a passenger arriving at a random time
+                row["average_wait_seconds"] = round(
+                    stats.headway_sq[board] / (2 * stats.headway_sum[board]), 1
+                )
+            for lead, counts in enumerate(stats.errors[board]):
+                total = int(counts.sum())
+                if not total:
+                    continue
+                row["prediction_error_seconds"].append(
+                    {
+                        "lead_minutes": f"{LEAD_EDGES[lead] // 60}-"
+                        f"{LEAD_EDGES[lead + 1] // 60}",
+                        "count": total,
+                        "mean": round(stats.error_sum[board, lead] / total, 1),
+                        "p10": _histogram_quantile(counts, ERROR_EDGES, 0.1),
+                        "median": _histogram_quantile(counts, ERROR_EDGES, 0.5),
+                        "p90": _histogram_quantile(counts, ERROR_EDGES, 0.9),
+                    }
+                )
+            yield row
+
+
+def _isoformat(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+def route_stop_ids(route: str) -> list[str]:
+    """GTFS stop IDs of the stations served by route"""
+    return sorted(
+        stop_id
+        for stop_id, station in get_stations_dict().items()
+        if route in station.routes
+    )
+
+
+def headway_report(
+    archive: FeedArchive,
+    group: str,
+    route: str,
+    stop_ids: list[str],
+    start: int,
+    end: int,
+    period: int,
+) -> Iterator[dict]:
+    """
+    Per period and board stats for route between start and end, read from
+    the archived snapshots of feed group
+    """
+    analyzer = HeadwayAnalyzer(route, stop_ids, start, end, period)
+    # Predictions made up to a window before start still score arrivals
+    # in range, and arrivals near the end settle after it
+    snapshots = archive.scan(
+        group, start - ARRIVALS_WINDOW, end + PREDICTION_SETTLE + 60
+    )
+    count = 0
+    for count, (timestamp, payload) in enumerate(snapshots, 1):
+        feed = new_feed_message()
+        feed.ParseFromString(payload)
+        analyzer.add(timestamp, decode_feed(feed))
+        if count % CHUNK_SNAPSHOTS == 0:
+            yield from analyzer.process()
+    yield from analyzer.process(final=True)
+    logger.info("Headway report for %s read %s snapshots", route, count)
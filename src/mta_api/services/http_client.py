@@ -0,0 +1,38 @@
+import os
+
+import httpx
+
+from mta_api.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+CONNECT_TIMEOUT = float(os.getenv("MTA_HTTP_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT = float(os.getenv("MTA_HTTP_READ_TIMEOUT", "10"))
+
+_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the app-wide pooled HTTP client, creating it on first use.
+    Connections are kept alive between polls and responses are requested
+    compressed (httpx decodes gzip/deflate transparently).
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        logger.info("Creating shared HTTP client")
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                READ_TIMEOUT, connect=CONNECT_TIMEOUT, pool=CONNECT_TIMEOUT
+            ),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            headers={"Accept-Encoding": "gzip, deflate"},
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
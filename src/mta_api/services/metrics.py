@@ -0,0 +1,148 @@
+"""
+Prometheus metrics for the API process, exposed on /metrics.
+
+Hot-path metrics are plain prometheus_client counters and histograms.
+Feed state (snapshot age, poll failures, feed cache hit rates) is read
+only when scraped, by FeedStateCollector, so it costs nothing per request.
+Each uvicorn worker reports its own values.
+"""
+
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterator
+from urllib.parse import unquote
+
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+if TYPE_CHECKING:
+    from mta_api.services.feed_cache import FeedCache
+    from mta_api.services.feed_poller import FeedPoller
+    from mta_api.services.feed_snapshot import FeedSnapshot
+    from mta_api.services.response_cache import ArrivalsResponseCache
+    from mta_api.services.shared_feeds import SharedFeedReader
+
+# Arrivals lookups are binary searches, far below the default buckets
+FAST_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+
+FEED_FETCH_SECONDS = Histogram(
+    "mta_feed_fetch_seconds", "Upstream GTFS-RT request latency", ["feed"]
+)
+FEED_PARSE_SECONDS = Histogram(
+    "mta_feed_parse_seconds", "Protobuf parse time of a GTFS-RT payload", ["feed"]
+)
+FEED_INDEX_SECONDS = Histogram(
+    "mta_feed_index_seconds", "Time to decode and index a parsed feed", ["feed"]
+)
+ARRIVALS_SECONDS = Histogram(
+    "mta_arrivals_compute_seconds",
+    "Time to compute the arrivals of one stop from a feed snapshot",
+    ["feed"],
+    buckets=FAST_BUCKETS,
+)
+STOP_UPDATES = Counter(
+    "mta_feed_stop_updates",
+    "Stop time updates from feeds: decoded with an arrival (processed), "
+    "decoded without one (skipped) or kept from an unchanged trip (reused)",
+    ["feed", "outcome"],
+)
+UPSTREAM_ERRORS = Counter(
+    "mta_upstream_errors",
+    "Failed feed fetches, by HTTP status or error type",
+    ["feed", "status"],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "mta_http_request_seconds",
+    "API request latency by route template",
+    ["method", "path", "status"],
+)
+ARRIVAL_REQUESTS = Counter(
+    "mta_arrival_requests", "Arrivals looked up, by subway route", ["route"]
+)
+
+
+@lru_cache(maxsize=64)
+def feed_label(url: str) -> str:
+    """Short label for a feed URL, e.g. "gtfs-ace" """
+    return unquote(url).rstrip("/").rsplit("/", 1)[-1]
+
+
+class FeedStateCollector(Collector):
+    """Feed snapshot ages, poll failures and feed cache counts at scrape time"""
+
+    def __init__(
+        self,
+        poller: "FeedPoller | SharedFeedReader",
+        cache: "FeedCache",
+        snapshots: "dict[str, FeedSnapshot]",
+    ):
+        self.poller = poller
+        self.cache = cache
+        self.snapshots = snapshots
+
+    def collect(self) -> Iterator:
+        age = GaugeMetricFamily(
+            "mta_feed_snapshot_age_seconds",
+            "Seconds since the latest snapshot of each feed was fetched",
+            labels=["feed"],
+        )
+        for url, snapshot in list(self.snapshots.items()):
+            age.add_metric([feed_label(url)], snapshot.age)
+        yield age
+
+        failures = GaugeMetricFamily(
+            "mta_feed_poll_consecutive_failures",
+            "Consecutive failed polls of each feed",
+            labels=["feed"],
+        )
+        for url, status in self.poller.status().items():
+            failures.add_metric([feed_label(url)], status["consecutive_failures"])
+        yield failures
+
+        requests = CounterMetricFamily(
+            "mta_feed_cache_requests",
+            "Feed cache lookups by result",
+            labels=["result"],
+        )
+        for result, count in self.cache.stats().items():
+            requests.add_metric([result], count)
+        yield requests
+
+
+class ResponseCacheCollector(Collector):
+    """Arrivals response cache counts and size at scrape time"""
+
+    def __init__(self, cache: "ArrivalsResponseCache"):
+        self.cache = cache
+
+    def collect(self) -> Iterator:
+        stats = self.cache.stats()
+        requests = CounterMetricFamily(
+            "mta_arrivals_cache_requests",
+            "Arrivals response cache lookups by result",
+            labels=["result"],
+        )
+        requests.add_metric(["hit"], stats["hits"])
+        requests.add_metric(["miss"], stats["misses"])
+        yield requests
+
+        removals = CounterMetricFamily(
+            "mta_arrivals_cache_removals",
+            "Arrivals responses removed from the cache: evicted to stay within "
+            "budget, or invalidated by a new feed generation",
+            labels=["reason"],
+        )
+        removals.add_metric(["evicted"], stats["evictions"])
+        removals.add_metric(["invalidated"], stats["invalidations"])
+        yield removals
+
+        yield GaugeMetricFamily(
+            "mta_arrivals_cache_entries",
+            "Arrivals responses cached",
+            value=stats["entries"],
+        )
+        yield GaugeMetricFamily(
+            "mta_arrivals_cache_bytes",
+            "Bytes of arrivals responses cached",
+            value=stats["bytes"],
+        )
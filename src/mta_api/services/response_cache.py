@@ -0,0 +1,151 @@
+"""
+Encoded arrivals responses, reused within a feed generation.
+
+Every caller asking for the same (route, stop) while a feed generation
+is current gets the same answer, until the clock moves a train out of
+or into the arrivals window. So the encoded body is kept with the
+generation it came from and the time it stops being right, and served
+as is until either changes. Entries are evicted least recently used
+first, to stay within both an entry and a byte budget.
+
+As a feed poller listener, the cache drops the entries a new generation
+invalidates. When the snapshot says which boards changed, entries for
+the other stops are carried over to the new generation instead.
+"""
+
+import os
+from collections import OrderedDict
+from typing import NamedTuple
+
+from prometheus_client import REGISTRY
+
+from mta_api.services.feed_decoder import NORTH, SOUTH
+from mta_api.services.feed_snapshot import FeedSnapshot
+from mta_api.services.metrics import ResponseCacheCollector
+from mta_api.services.train_service import feed_poller
+from mta_api.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+MAX_ENTRIES = int(os.getenv("MTA_ARRIVALS_CACHE_ENTRIES", "20000"))
+MAX_BYTES = int(os.getenv("MTA_ARRIVALS_CACHE_BYTES", str(16 * 1024 * 1024)))
+
+
+class CachedResponse(NamedTuple):
+    url: str
+    generation: int
+    expires_at: int | None  # epoch seconds; None: good for the whole generation
+    body: bytes
+
+
+class ArrivalsResponseCache:
+    """LRU cache of encoded arrivals bodies keyed by (route, GTFS stop ID)"""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple[str, str], CachedResponse] = OrderedDict()
+        self._bytes = 0
+        # Fetch time and generation of the last snapshot published per URL
+        self._published: dict[str, tuple[float, int]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self, generation: int, route: str, stop_id: str, now: int
+    ) -> CachedResponse | None:
+        """The entry cached for route and stop_id, if computed from generation"""
+        key = (route, stop_id)
+        entry = self._entries.get(key)
+        if (
+            entry is None
+            or entry.generation != generation
+            or (entry.expires_at is not None and now >= entry.expires_at)
+        ):
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(
+        self,
+        snapshot: FeedSnapshot,
+        route: str,
+        stop_id: str,
+        body: bytes,
+        expires_at: int | None = None,
+    ) -> None:
+        key = (route, stop_id)
+        self._discard(key)
+        if len(body) > self.max_bytes:
+            return
+        self._entries[key] = CachedResponse(
+            snapshot.url, snapshot.generation, expires_at, body
+        )
+        self._bytes += len(body)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted.body)
+            self.evictions += 1
+
+    def _discard(self, key: tuple[str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry.body)
+
+    def publish(self, snapshot: FeedSnapshot) -> None:
+        """Poller listener: invalidate what a new generation of a feed changed"""
+        previous = self._published.get(snapshot.url)
+        self._published[snapshot.url] = (snapshot.fetched_at, snapshot.generation)
+        changed = snapshot.changed_boards
+        # Only entries of the generation the changes are relative to carry over
+        carried_generation = None
+        if previous is not None and snapshot.changed_since == previous[0]:
+            carried_generation = previous[1]
+
+        carried = dropped = 0
+        for key, entry in list(self._entries.items()):
+            if entry.url != snapshot.url or entry.generation == snapshot.generation:
+                continue
+            stop_id = key[1]
+            if (
+                changed is not None
+                and entry.generation == carried_generation
+                and (stop_id, NORTH) not in changed
+                and (stop_id, SOUTH) not in changed
+            ):
+                # Same bytes, now vouched for by the new generation
+                self._entries[key] = entry._replace(generation=snapshot.generation)
+                carried += 1
+            else:
+                self._discard(key)
+                dropped += 1
+        self.invalidations += dropped
+        logger.debug(
+            "Feed %s refresh kept %s cached arrivals and dropped %s",
+            snapshot.url,
+            carried,
+            dropped,
+        )
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+
+arrivals_cache = ArrivalsResponseCache()
+feed_poller.add_listener(arrivals_cache.publish)
+
+REGISTRY.register(ResponseCacheCollector(arrivals_cache))
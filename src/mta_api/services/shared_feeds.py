@@ -0,0 +1,357 @@
+"""
+Feed snapshots shared between processes through memory-mapped files.
+
+With several uvicorn workers per box, one writer process polls, decodes
+and indexes every feed, and the workers map its output instead of each
+fetching the feeds themselves:
+
+    MTA_SHARED_FEEDS_DIR=/dev/shm/mta-feeds python -m mta_api.services.shared_feeds
+    MTA_SHARED_FEEDS_DIR=/dev/shm/mta-feeds uvicorn mta_api.main:app --workers 4
+
+Each feed's arrivals index is one flat region, SHARED_FEEDS_DIR/<feed>.feed:
+a header stamped with the feed generation, the arrival times and route
+codes sorted by board, the bounds of each board, and a JSON trailer
+naming the boards and routes. Workers wrap the arrays with numpy right
+over the mapping, without copying them.
+
+A published region is never modified. The writer writes the next one to
+a temporary file, renames it over the old one and then bumps the feed's
+sequence number in the control file, which every worker keeps mapped.
+Workers compare that number with the one they last mapped on each
+lookup, a plain memory read, and remap when it moved, so the read path
+takes no locks. A replaced region stays mapped until the last snapshot
+using it is dropped.
+"""
+
+import argparse
+import asyncio
+import fcntl
+import json
+import mmap
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+import numpy as np
+
+from mta_api.services.feed_poller import POLL_INTERVAL
+from mta_api.services.feed_snapshot import ArrivalsIndex, FeedSnapshot
+from mta_api.services.metrics import feed_label
+from mta_api.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Empty: every worker polls the feeds itself
+SHARED_FEEDS_DIR = os.getenv("MTA_SHARED_FEEDS_DIR", "")
+CONTROL_FILE = "control"
+WATCH_INTERVAL = 1.0  # seconds between checks for new generations to announce
+REOPEN_INTERVAL = 1.0  # seconds between attempts to map a missing control file
+
+MAGIC = b"MTAF"
+VERSION = 1
+HEADER = np.dtype(
+    [
+        ("magic", "S4"),
+        ("version", "<u4"),
+        ("timestamp", "<i8"),
+        ("fetched_at", "<f8"),
+        ("rows", "<i8"),
+        ("boards", "<i8"),
+        ("meta", "<i8"),
+    ]
+)
+# One record per feed URL, in sorted URL order
+CONTROL_ENTRY = np.dtype([("sequence", "<i8"), ("failures", "<i8")])
+
+
+def region_path(root: Path, url: str) -> Path:
+    return root / f"{feed_label(url)}.feed"
+
+
+def encode_snapshot(snapshot: FeedSnapshot) -> bytes:
+    """The shared-memory region of a snapshot's arrivals index"""
+    arrival, route, boards = snapshot.index.arrays()
+    bounds = np.array(list(boards.values()), dtype=np.int64).reshape(-1, 2)
+    changed = snapshot.changed_boards
+    meta = json.dumps(
+        {
+            "url": snapshot.url,
+            "route_ids": snapshot.index.route_ids,
+            "boards": list(boards),
+            "changed_boards": None if changed is None else sorted(changed),
+            "changed_since": snapshot.changed_since,
+        }
+    ).encode()
+    header = np.array(
+        [
+            (
+                MAGIC,
+                VERSION,
+                snapshot.timestamp,
+                snapshot.fetched_at,
+                len(arrival),
+                len(boards),
+                len(meta),
+            )
+        ],
+        dtype=HEADER,
+    )
+    # Widest arrays first keeps each one aligned to its item size
+    return b"".join(
+        (
+            header.tobytes(),
+            arrival.astype("<i8", copy=False).tobytes(),
+            bounds.tobytes(),
+            route.astype("<i2", copy=False).tobytes(),
+            meta,
+        )
+    )
+
+
+def decode_region(buffer) -> FeedSnapshot:
+    """A snapshot whose index arrays are views of buffer"""
+    header = np.frombuffer(buffer, dtype=HEADER, count=1)[0]
+    if header["magic"] != MAGIC or header["version"] != VERSION:
+        raise ValueError(f"not a version {VERSION} shared feed region")
+    rows, boards = int(header["rows"]), int(header["boards"])
+
+    offset = HEADER.itemsize
+    arrival = np.frombuffer(buffer, dtype="<i8", count=rows, offset=offset)
+    offset += arrival.nbytes
+    bounds = np.frombuffer(buffer, dtype="<i8", count=2 * boards, offset=offset)
+    offset += bounds.nbytes
+    route = np.frombuffer(buffer, dtype="<i2", count=rows, offset=offset)
+    offset += route.nbytes
+    meta = json.loads(bytes(buffer[offset : offset + int(header["meta"])]))
+
+    board_bounds = {
+        (stop_id, direction): (lo, hi)
+        for (stop_id, direction), (lo, hi) in zip(
+            meta["boards"], bounds.reshape(-1, 2).tolist()
+        )
+    }
+    changed = meta["changed_boards"]
+    return FeedSnapshot(
+        url=meta["url"],
+        feed=None,
+        index=ArrivalsIndex.from_arrays(
+            meta["route_ids"], arrival, route, board_bounds
+        ),
+        fetched_at=float(header["fetched_at"]),
+        timestamp=int(header["timestamp"]),
+        changed_boards=None if changed is None else frozenset(map(tuple, changed)),
+        changed_since=meta["changed_since"],
+    )
+
+
+class SharedFeedWriter:
+    """
+    Publishes snapshots for SharedFeedReaders to map. Only one writer may
+    use a directory at a time.
+    """
+
+    def __init__(self, root: Path, urls: Iterable[str]):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._slots = {url: i for i, url in enumerate(sorted(set(urls)))}
+
+        fd = os.open(self.root / CONTROL_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            raise RuntimeError(f"Another writer is publishing to {self.root}")
+        self._fd = fd
+        # Keep the sequence numbers of an earlier writer, so readers that
+        # mapped its regions still see the next generation as new
+        size = len(self._slots) * CONTROL_ENTRY.itemsize
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        self._mapped = mmap.mmap(fd, size)
+        self._control = np.frombuffer(self._mapped, dtype=CONTROL_ENTRY)
+
+    def publish(self, snapshot: FeedSnapshot) -> None:
+        """Poller listener: replace the region of the snapshot's feed"""
+        slot = self._slots.get(snapshot.url)
+        if slot is None:
+            return
+        path = region_path(self.root, snapshot.url)
+        temporary = path.with_suffix(".tmp")
+        data = encode_snapshot(snapshot)
+        temporary.write_bytes(data)
+        os.replace(temporary, path)
+        self._control["sequence"][slot] += 1
+        logger.debug("Published %s bytes for %s", len(data), snapshot.url)
+
+    def update_status(self, status: dict[str, dict[str, Any]]) -> None:
+        """Share the poller's consecutive failures per feed"""
+        for url, feed_status in status.items():
+            slot = self._slots.get(url)
+            if slot is not None:
+                self._control["failures"][slot] = feed_status["consecutive_failures"]
+
+    def close(self) -> None:
+        del self._control
+        self._mapped.close()
+        os.close(self._fd)
+
+
+class SharedFeedReader:
+    """
+    Maps the snapshots of a SharedFeedWriter. It stands in for FeedPoller
+    in the request workers: started, it announces each new generation to
+    the listeners, and get() always returns the latest generation.
+    """
+
+    def __init__(
+        self, root: Path, urls: Iterable[str], interval: float = POLL_INTERVAL
+    ):
+        self.root = Path(root)
+        self.urls = sorted(set(urls))
+        self.interval = interval  # the writer's poll interval
+        self.snapshots: dict[str, FeedSnapshot] = {}
+        self._slots = {url: i for i, url in enumerate(self.urls)}
+        self._control: np.ndarray | None = None
+        self._next_attempt = 0.0
+        self._sequences: dict[str, int] = {}  # sequence number of each mapping
+        self._announced: dict[str, FeedSnapshot] = {}
+        self._listeners: list[Callable[[FeedSnapshot], None]] = []
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def _control_entries(self) -> np.ndarray | None:
+        if self._control is None and time.monotonic() >= self._next_attempt:
+            self._next_attempt = time.monotonic() + REOPEN_INTERVAL
+            try:
+                with open(self.root / CONTROL_FILE, "rb") as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (FileNotFoundError, ValueError):
+                # ValueError: the writer hasn't sized the file yet
+                return None
+            control = np.frombuffer(mapped, dtype=CONTROL_ENTRY)
+            if len(control) != len(self.urls):
+                logger.error(
+                    "Shared feeds in %s are for %s feeds, expected %s",
+                    self.root,
+                    len(control),
+                    len(self.urls),
+                )
+                return None
+            self._control = control
+        return self._control
+
+    def get(self, url: str) -> FeedSnapshot | None:
+        control = self._control_entries()
+        slot = self._slots.get(url)
+        if control is None or slot is None:
+            return None
+        sequence = int(control["sequence"][slot])
+        if sequence != self._sequences.get(url):
+            self._sequences[url] = sequence
+            snapshot = self._map(url)
+            if snapshot is not None:
+                self.snapshots[url] = snapshot
+        return self.snapshots.get(url)
+
+    def _map(self, url: str) -> FeedSnapshot | None:
+        try:
+            with open(region_path(self.root, url), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return decode_region(mapped)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logger.error("Unreadable shared feed region for %s: %s", url, e)
+            return None
+
+    def add_listener(self, listener: Callable[[FeedSnapshot], None]) -> None:
+        """Call listener with every new generation mapped"""
+        self._listeners.append(listener)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        logger.info("Reading shared feed snapshots from %s", self.root)
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _watch(self) -> None:
+        while True:
+            for url in self.urls:
+                snapshot = self.get(url)
+                if snapshot is None or self._announced.get(url) is snapshot:
+                    continue
+                self._announced[url] = snapshot
+                for listener in self._listeners:
+                    try:
+                        listener(snapshot)
+                    except Exception as e:
+                        logger.error(
+                            "Feed listener failed for %s: %s", url, e, exc_info=True
+                        )
+            await asyncio.sleep(WATCH_INTERVAL)
+
+    def status(self) -> dict[str, dict[str, Any]]:
+        """Per-feed snapshot age and the writer's failure state."""
+        control = self._control_entries()
+        result = {}
+        for url in self.urls:
+            snapshot = self.get(url)
+            failures = 0 if control is None else control["failures"][self._slots[url]]
+            result[url] = {
+                "age_seconds": round(snapshot.age, 1) if snapshot else None,
+                "consecutive_failures": int(failures),
+                "last_error": None if control is not None else "nothing published yet",
+            }
+        return result
+
+
+async def run_writer(root: Path) -> None:
+    """Poll every feed and publish the snapshots under root, until cancelled"""
+    from mta_api.services.feed_poller import FeedPoller
+    from mta_api.services.http_client import close_http_client
+    from mta_api.services.train_service import URL_DICT, load_snapshot
+
+    writer = SharedFeedWriter(root, URL_DICT.values())
+    poller = FeedPoller(URL_DICT.values(), load_snapshot)
+    poller.add_listener(writer.publish)
+    await poller.start()
+    try:
+        while True:
+            writer.update_status(poller.status())
+            await asyncio.sleep(WATCH_INTERVAL)
+    finally:
+        await poller.stop()
+        await close_http_client()
+        writer.close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--dir",
+        default=SHARED_FEEDS_DIR,
+        help="directory to publish to, ideally on tmpfs (default: MTA_SHARED_FEEDS_DIR)",
+    )
+    args = parser.parse_args(argv)
+    if not args.dir:
+        parser.error("--dir or MTA_SHARED_FEEDS_DIR is required")
+
+    logger.info("Publishing shared feed snapshots to %s", args.dir)
+    try:
+        asyncio.run(run_writer(Path(args.dir)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import asyncio
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import cache
+from typing import Any, NamedTuple
+
+from mta_api.data.station_parser import get_complexes
+from mta_api.services.feed_decoder import NORTH, SOUTH
+from mta_api.services.train_service import (
+    ARRIVALS_WINDOW,
+    MAX_ARRIVALS,
+    URL_DICT,
+    format_arrival_epoch,
+    get_url_snapshot,
+)
+from mta_api.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class BoardStop(NamedTuple):
+    """One route calling at one stop of a complex"""
+
+    route: str
+    stop_id: str
+    url: str
+    north_label: str
+    south_label: str
+
+
+@dataclass(frozen=True)
+class ComplexPlan:
+    """Everything needed to answer a complex's board, resolved once"""
+
+    complex_id: str
+    names: tuple[str, ...]
+    stops: tuple[BoardStop, ...]
+    urls: tuple[str, ...]
+
+
+@cache
+def get_complex_plans() -> dict[str, ComplexPlan]:
+    """Precompute the route/stop/feed layout of every station complex"""
+    plans = {}
+    for complex_id, stations in get_complexes().items():
+        stops = tuple(
+            BoardStop(
+                route=route,
+                stop_id=station.stop_id,
+                url=URL_DICT[route],
+                north_label=station.north_label,
+                south_label=station.south_label,
+            )
+            for station in stations
+            for route in station.routes
+            if route in URL_DICT
+        )
+        plans[complex_id] = ComplexPlan(
+            complex_id=complex_id,
+            names=tuple(dict.fromkeys(station.name for station in stations)),
+            stops=stops,
+            urls=tuple(dict.fromkeys(stop.url for stop in stops)),
+        )
+    logger.info(f"Precomputed board plans for {len(plans)} station complexes")
+    return plans
+
+
+@cache
+def get_complex_ids_by_name() -> dict[str, list[str]]:
+    """Map each stop name to the complexes that have a stop by that name"""
+    by_name = defaultdict(list)
+    for plan in get_complex_plans().values():
+        for name in plan.names:
+            by_name[name].append(plan.complex_id)
+    return dict(by_name)
+
+
+def resolve_complex_ids(station: str) -> list[str]:
+    """Complex IDs matching a Complex ID or stop name (names aren't unique)"""
+    if station in get_complex_plans():
+        return [station]
+    return get_complex_ids_by_name().get(station, [])
+
+
+async def get_station_board(complex_id: str) -> dict[str, Any]:
+    """
+    Combined departure board for every route at a station complex,
+    grouped by route and direction and ordered by next arrival.
+    """
+    plan = get_complex_plans()[complex_id]
+    snapshots = dict(
+        zip(plan.urls, await asyncio.gather(*map(get_url_snapshot, plan.urls)))
+    )
+
+    now = int(time.time())
+    end = now + ARRIVALS_WINDOW
+    routes = []
+    departures: list[tuple[int, str, str, str]] = []
+    unavailable = []
+
+    for stop in plan.stops:
+        snapshot = snapshots[stop.url]
+        if snapshot is None:
+            unavailable.append(stop.route)
+            continue
+
+        board: dict[str, Any] = {"route": stop.route, "stop_id": stop.stop_id}
+        next_arrival = None
+        for key, direction, label in (
+            ("north", NORTH, stop.north_label),
+            ("south", SOUTH, stop.south_label),
+        ):
+            arrivals = snapshot.index.upcoming(
+                stop.stop_id, direction, now, end, MAX_ARRIVALS, route=stop.route
+            )
+            times = [format_arrival_epoch(t) for t, _ in arrivals]
+            board[key] = {"label": label, "arrivals": times}
+            departures.extend(
+                (t, stop.route, label, formatted)
+                for (t, _), formatted in zip(arrivals, times)
+            )
+            if arrivals and (next_arrival is None or arrivals[0][0] < next_arrival):
+                next_arrival = arrivals[0][0]
+        routes.append((next_arrival is None, next_arrival or 0, stop.route, board))
+
+    routes.sort(key=lambda item: item[:3])
+    departures.sort()
+
+    return {
+        "complex_id": plan.complex_id,
+        "stations": list(plan.names),
+        "routes": [board for *_, board in routes],
+        "departures": [
+            {"route": route, "direction": label, "time": formatted}
+            for _, route, label, formatted in departures
+        ],
+        "unavailable_routes": unavailable,
+    }
@@ -1,144 +1,325 @@
-import heapq
-from datetime import datetime, timedelta
-
-import pytz
-import requests
-from google.transit import gtfs_realtime_pb2  # type: ignore[import-untyped]
+import asyncio
+import os
+import time
+from dataclasses import replace
+from datetime import datetime, timezone
+from functools import cache, lru_cache
+from pathlib import Path
+from typing import Any
+
+import httpx
+from prometheus_client import REGISTRY
 
 from mta_api.data.station_parser import get_stops_dict
+from mta_api.services.feed_archive import feed_archive
+from mta_api.services.feed_cache import FeedCache
+from mta_api.services.feed_poller import FeedPoller
+from mta_api.services.feed_decoder import NORTH, SOUTH
+from mta_api.services.feed_snapshot import FeedSnapshot
+from mta_api.services.shared_feeds import SHARED_FEEDS_DIR, SharedFeedReader
+from mta_api.services.http_client import get_http_client
+from mta_api.services.metrics import (
+    ARRIVALS_SECONDS,
+    FEED_FETCH_SECONDS,
+    FEED_INDEX_SECONDS,
+    FEED_PARSE_SECONDS,
+    STOP_UPDATES,
+    UPSTREAM_ERRORS,
+    FeedStateCollector,
+    feed_label,
+)
 from mta_api.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-NYC_TZ = pytz.timezone("America/New_York")
-
 MAX_ARRIVALS = 4
+ARRIVALS_WINDOW = 30 * 60  # seconds
+FORMATTED_MINUTES = 4096  # about three days of formatted arrival times
+
+# Point at a local stand-in (see mta_api.utils.mock_feeds) for load testing
+FEED_BASE_URL = os.getenv(
+    "MTA_FEED_BASE_URL", "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds"
+).rstrip("/")
 
 URL_DICT = {
-    "A": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-ace",
-    "C": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-ace",
-    "E": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-ace",
-    "B": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-bdfm",
-    "D": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-bdfm",
-    "F": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-bdfm",
-    "M": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-bdfm",
-    "G": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-g",
-    "J": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-jz",
-    "Z": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-jz",
-    "N": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-nqrw",
-    "Q": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-nqrw",
-    "R": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-nqrw",
-    "W": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-nqrw",
-    "L": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-l",
-    "1": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs",
-    "2": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs",
-    "3": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs",
-    "4": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs",
-    "5": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs",
-    "6": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs",
-    "7": "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs",
+    "A": f"{FEED_BASE_URL}/nyct%2Fgtfs-ace",
+    "C": f"{FEED_BASE_URL}/nyct%2Fgtfs-ace",
+    "E": f"{FEED_BASE_URL}/nyct%2Fgtfs-ace",
+    "B": f"{FEED_BASE_URL}/nyct%2Fgtfs-bdfm",
+    "D": f"{FEED_BASE_URL}/nyct%2Fgtfs-bdfm",
+    "F": f"{FEED_BASE_URL}/nyct%2Fgtfs-bdfm",
+    "M": f"{FEED_BASE_URL}/nyct%2Fgtfs-bdfm",
+    "G": f"{FEED_BASE_URL}/nyct%2Fgtfs-g",
+    "J": f"{FEED_BASE_URL}/nyct%2Fgtfs-jz",
+    "Z": f"{FEED_BASE_URL}/nyct%2Fgtfs-jz",
+    "N": f"{FEED_BASE_URL}/nyct%2Fgtfs-nqrw",
+    "Q": f"{FEED_BASE_URL}/nyct%2Fgtfs-nqrw",
+    "R": f"{FEED_BASE_URL}/nyct%2Fgtfs-nqrw",
+    "W": f"{FEED_BASE_URL}/nyct%2Fgtfs-nqrw",
+    "L": f"{FEED_BASE_URL}/nyct%2Fgtfs-l",
+    "1": f"{FEED_BASE_URL}/nyct%2Fgtfs",
+    "2": f"{FEED_BASE_URL}/nyct%2Fgtfs",
+    "3": f"{FEED_BASE_URL}/nyct%2Fgtfs",
+    "4": f"{FEED_BASE_URL}/nyct%2Fgtfs",
+    "5": f"{FEED_BASE_URL}/nyct%2Fgtfs",
+    "6": f"{FEED_BASE_URL}/nyct%2Fgtfs",
+    "7": f"{FEED_BASE_URL}/nyct%2Fgtfs",
 }
 
 
-def fetch_and_parse_gtfs(line: str):
-    url = URL_DICT[line]
-    logger.debug(f"Fetching GTFS data for line {line} from {url}")
+# Validators from the last good response per URL, for conditional requests
+_validators: dict[str, dict[str, str]] = {}
+_last_feeds: dict[str, Any] = {}
+_last_snapshots: dict[str, FeedSnapshot] = {}
+
+
+@cache
+def get_nyc_tz():
+    import pytz
+
+    return pytz.timezone("America/New_York")
+
+
+def new_feed_message():
+    """An empty GTFS-RT FeedMessage; the protobuf bindings load on first use"""
+    from google.transit import gtfs_realtime_pb2  # type: ignore[import-untyped]
+
+    return gtfs_realtime_pb2.FeedMessage()
+
+
+async def fetch_feed(url: str):
+    logger.debug("Fetching GTFS data from %s", url)
+    feed_name = feed_label(url)
+
+    start = time.perf_counter()
+    try:
+        response = await get_http_client().get(url, headers=_validators.get(url))
+    except httpx.HTTPError as e:
+        logger.error("Failed to retrieve data from %s: %r", url, e)
+        UPSTREAM_ERRORS.labels(feed_name, type(e).__name__).inc()
+        return None
+    FEED_FETCH_SECONDS.labels(feed_name).observe(time.perf_counter() - start)
+
+    if response.status_code == 304 and url in _last_feeds:
+        logger.debug("GTFS feed not modified at %s", url)
+        return _last_feeds[url]
 
-    response = requests.get(url)
     if response.status_code != 200:
-        logger.error(f"Failed to retrieve data: {response.status_code}")
+        logger.error("Failed to retrieve data: %s", response.status_code)
+        UPSTREAM_ERRORS.labels(feed_name, str(response.status_code)).inc()
         return None
 
-    feed = gtfs_realtime_pb2.FeedMessage()
+    feed = new_feed_message()
+    start = time.perf_counter()
     try:
         feed.ParseFromString(response.content)
-        logger.debug(f"Successfully parsed GTFS feed for line {line}")
-        return feed
+        logger.debug("Successfully parsed GTFS feed from %s", url)
     except Exception as e:
-        logger.error(f"Error parsing GTFS feed: {str(e)}", exc_info=True)
+        logger.error("Error parsing GTFS feed: %s", e, exc_info=True)
+        UPSTREAM_ERRORS.labels(feed_name, "parse").inc()
+        return None
+    FEED_PARSE_SECONDS.labels(feed_name).observe(time.perf_counter() - start)
+
+    await archive_payload(url, feed, response.content)
+
+    validators = {}
+    if etag := response.headers.get("ETag"):
+        validators["If-None-Match"] = etag
+    if last_modified := response.headers.get("Last-Modified"):
+        validators["If-Modified-Since"] = last_modified
+    _validators[url] = validators
+    _last_feeds[url] = feed
+    return feed
+
+
+async def archive_payload(url: str, feed, payload: bytes) -> None:
+    if feed_archive is None:
+        return
+    timestamp = feed.header.timestamp or int(time.time())
+    try:
+        await asyncio.to_thread(
+            feed_archive.append, feed_label(url), timestamp, payload
+        )
+    except OSError as e:
+        logger.error("Failed to archive feed %s: %s", url, e)
+
+
+async def load_snapshot(url: str) -> FeedSnapshot | None:
+    feed = await fetch_feed(url)
+    if feed is None:
         return None
 
+    previous = _last_snapshots.get(url)
+    if previous is not None and previous.feed is feed:
+        # Upstream said not modified, so the existing index is still valid
+        snapshot = replace(
+            previous,
+            fetched_at=time.time(),
+            changed_boards=frozenset(),
+            changed_since=previous.fetched_at,
+        )
+    else:
+        feed_name = feed_label(url)
+        start = time.perf_counter()
+        snapshot = FeedSnapshot.from_feed(url, feed, previous)
+        FEED_INDEX_SECONDS.labels(feed_name).observe(time.perf_counter() - start)
+        columns = snapshot.index.columns
+        # Always set for an index decoded here, as opposed to a shared one
+        assert columns is not None
+        STOP_UPDATES.labels(feed_name, "processed").inc(len(columns) - columns.reused)
+        STOP_UPDATES.labels(feed_name, "reused").inc(columns.reused)
+        STOP_UPDATES.labels(feed_name, "skipped").inc(columns.skipped)
+    _last_snapshots[url] = snapshot
+    return snapshot
+
+
+# Several routes share one feed URL, so the cache is keyed by URL
+feed_cache = FeedCache(load_snapshot)
+
+feed_poller: FeedPoller | SharedFeedReader
+if SHARED_FEEDS_DIR:
+    # A separate writer process polls; see mta_api.services.shared_feeds
+    feed_poller = SharedFeedReader(Path(SHARED_FEEDS_DIR), URL_DICT.values())
+    REGISTRY.register(
+        FeedStateCollector(feed_poller, feed_cache, feed_poller.snapshots)
+    )
+else:
+    feed_poller = FeedPoller(URL_DICT.values(), load_snapshot)
+    REGISTRY.register(FeedStateCollector(feed_poller, feed_cache, _last_snapshots))
 
-def format_arrival_time(time) -> str:
-    return time.astimezone(NYC_TZ).strftime("%I:%M %p")
 
+async def get_feed_snapshot(line: str) -> FeedSnapshot | None:
+    return await get_url_snapshot(URL_DICT[line])
 
-def process_gtfs_data(line, gtfs_stop_id) -> dict[str, str] | None:
-    logger.info(f"Processing GTFS data for line {line}, stop {gtfs_stop_id}")
 
-    arrivals: dict[str, list[tuple[float, str]]] = {"north": [], "south": []}
-    feed = fetch_and_parse_gtfs(line)
+async def get_url_snapshot(url: str) -> FeedSnapshot | None:
+    snapshot = feed_poller.get(url)
+    if snapshot is not None or SHARED_FEEDS_DIR:
+        # Workers reading shared feeds never fetch upstream themselves
+        return snapshot
+    # Poller not running or first poll not in yet
+    return await feed_cache.get(url)
 
-    if not feed:
+
+def seconds_until_refresh(snapshot: FeedSnapshot) -> int:
+    """Seconds until a newer snapshot of this feed is expected"""
+    interval = feed_poller.interval if feed_poller.running else feed_cache.ttl
+    return max(0, int(snapshot.fetched_at + interval - time.time()))
+
+
+def load_archived_snapshot(url: str, timestamp: int) -> FeedSnapshot | None:
+    """Look up, parse and index an archived feed; blocking"""
+    assert feed_archive is not None
+    found = feed_archive.lookup(feed_label(url), timestamp)
+    if found is None:
+        return None
+
+    archived_at, payload = found
+    feed = new_feed_message()
+    feed.ParseFromString(payload)
+    return replace(FeedSnapshot.from_feed(url, feed), fetched_at=archived_at)
+
+
+async def get_archived_snapshot(line: str, timestamp: int) -> FeedSnapshot | None:
+    """The archived snapshot of line's feed current at timestamp"""
+    if feed_archive is None:
+        return None
+    # Parsing and indexing a whole feed would stall the event loop too
+    return await asyncio.to_thread(load_archived_snapshot, URL_DICT[line], timestamp)
+
+
+async def fetch_and_parse_gtfs(line: str):
+    snapshot = await get_feed_snapshot(line)
+    return snapshot.feed if snapshot else None
+
+
+def format_arrival_time(time: datetime) -> str:
+    """New York wall-clock time of an aware datetime, e.g. "03:42 PM" """
+    return time.astimezone(get_nyc_tz()).strftime("%I:%M %p")
+
+
+@lru_cache(maxsize=FORMATTED_MINUTES)
+def format_arrival_minute(minute: int) -> str:
+    return format_arrival_time(datetime.fromtimestamp(minute * 60, timezone.utc))
+
+
+def format_arrival_epoch(timestamp: int) -> str:
+    """
+    New York wall-clock time of epoch seconds. Every arrival in a minute
+    formats the same, so the strings are cached per minute.
+    """
+    return format_arrival_minute(timestamp // 60)
+
+
+def arrivals_from_snapshot(
+    snapshot: FeedSnapshot | None,
+    gtfs_stop_id: str,
+    route: str | None = None,
+    now: int | None = None,
+) -> dict[str, str] | None:
+    """
+    Upcoming downtown/uptown arrivals at a stop from one feed snapshot,
+    optionally only for one route, as of now (default: the current time)
+    """
+    if not snapshot:
         logger.warning("No feed received from fetch_and_parse_gtfs")
         return None
 
-    if not feed.entity:
-        logger.warning("Feed contains no entities")
+    if not len(snapshot.index):
+        logger.warning("Feed contains no arrivals")
         return None
 
-    now = datetime.now()
-    processed_count = 0
-    skipped_count = 0
-
-    for entity in feed.entity:
-        if not entity.HasField("trip_update"):
-            continue
-
-        trip = entity.trip_update
-        for stop_time_update in trip.stop_time_update:
-            stop_id: str = stop_time_update.stop_id
-
-            # Skip updates that don't meet our criteria
-            if (
-                not stop_time_update.HasField("arrival")
-                or not stop_id.startswith(gtfs_stop_id)
-                or (
-                    arrival_time := datetime.fromtimestamp(
-                        stop_time_update.arrival.time
-                    )
-                )
-                < now
-                or arrival_time - now > timedelta(minutes=30)
-            ):
-                skipped_count += 1
-                continue
-
-            time_diff = abs(now - arrival_time)
-            formatted_time = format_arrival_time(arrival_time)
-            direction = "north" if stop_id.endswith("N") else "south"
-
-            arrival_list = arrivals[direction]
-            arrival_info: tuple[timedelta, str] = (-time_diff, formatted_time)
-            heapq.heappush(arrival_list, arrival_info)  # type: ignore
-
-            if len(arrival_list) > MAX_ARRIVALS:
-                heapq.heappop(arrival_list)
-
-            processed_count += 1
-
-    logger.debug(
-        f"Processed {processed_count} arrivals, skipped {skipped_count} updates"
+    start = time.perf_counter()
+    index = snapshot.index
+    if now is None:
+        now = int(time.time())
+    end = now + ARRIVALS_WINDOW
+
+    result = {}
+    for key, direction in (("downtowns", SOUTH), ("uptowns", NORTH)):
+        arrivals = index.upcoming(
+            gtfs_stop_id, direction, now, end, MAX_ARRIVALS, route=route
+        )
+        result[key] = ", ".join(format_arrival_epoch(t) for t, _ in arrivals)
+    ARRIVALS_SECONDS.labels(feed_label(snapshot.url)).observe(
+        time.perf_counter() - start
     )
 
-    # Format the final results
-    downtowns = ", ".join(time for _, time in sorted(arrivals["south"], reverse=True))
-    uptowns = ", ".join(time for _, time in sorted(arrivals["north"], reverse=True))
-
-    result = {"downtowns": downtowns, "uptowns": uptowns}
-    logger.info(f"Final arrival times for stop {gtfs_stop_id}: {result}")
+    logger.debug("Final arrival times for stop %s: %s", gtfs_stop_id, result)
 
     return result
 
 
+def arrivals_change_at(
+    snapshot: FeedSnapshot, gtfs_stop_id: str, now: int
+) -> int | None:
+    """
+    When arrivals_from_snapshot for the stop, unchanged since now, would
+    next give a different answer just because time moved on; None if never
+    """
+    end = now + ARRIVALS_WINDOW
+    times = [
+        snapshot.index.changes_at(gtfs_stop_id, direction, now, end, MAX_ARRIVALS)
+        for direction in (SOUTH, NORTH)
+    ]
+    return min((t for t in times if t is not None), default=None)
+
+
+async def process_gtfs_data(line, gtfs_stop_id) -> dict[str, str] | None:
+    logger.info("Processing GTFS data for line %s, stop %s", line, gtfs_stop_id)
+
+    snapshot = await get_feed_snapshot(line)
+    return arrivals_from_snapshot(snapshot, gtfs_stop_id)
+
+
 if __name__ == "__main__":
     stop = "Times Sq-42 St"
     line = "1"
-    logger.info(f"Testing arrival times for {stop} on line {line}")
+    logger.info("Testing arrival times for %s on line %s", stop, line)
 
     gtfs_stop_id = get_stops_dict().get((stop, line))
     if not gtfs_stop_id:
-        logger.error(f"Could not find GTFS stop ID for {stop} on line {line}")
+        logger.error("Could not find GTFS stop ID for %s on line %s", stop, line)
     else:
-        result = process_gtfs_data(line, gtfs_stop_id)
-        logger.info(f"Test result: {result}")
+        result = asyncio.run(process_gtfs_data(line, gtfs_stop_id))
+        logger.info("Test result: %s", result)
@@ -0,0 +1,294 @@
+"""
+Offline microbenchmarks for the feed and station hot paths.
+
+Runs against the feed fixtures (see mta_api.utils.feed_fixtures), so it
+needs no network. Each case reports the best time per operation over
+several repeats and the peak Python heap allocated by one operation
+(tracemalloc doesn't see allocations inside the protobuf C extension).
+Results can be saved as a baseline and later runs checked against it:
+
+    python -m mta_api.utils.benchmark --save-baseline
+    python -m mta_api.utils.benchmark --check --threshold 0.25
+
+Timings only compare meaningfully on the machine the baseline came from.
+"""
+
+import argparse
+import fnmatch
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+# Measure the code, not the log volume, unless asked otherwise
+os.environ.setdefault("MTA_LOG_LEVEL", "WARNING")
+
+BASELINE_PATH = Path(
+    os.getenv(
+        "MTA_BENCHMARK_BASELINE",
+        Path(__file__).resolve().parents[3] / "benchmarks" / "baseline.json",
+    )
+)
+
+MATCH_QUERIES = [
+    "Times Sq",
+    "grand central",
+    "14 st union square",
+    "Atlantic Av Barclays",
+    "jamaica center",
+    "bway junction",
+    "court sq",
+    "125 street",
+    "Coney Island",
+    "fulton",
+]
+
+# Fraction of trips that change between two refreshes, for reindex:*
+REFRESH_CHURN = 0.1
+
+
+class Case(NamedTuple):
+    name: str
+    run: Callable[[], object]
+    ops: int  # operations per call of run, for the per-op figures
+    setup: Callable[[], object] | None = None  # untimed, before every call
+
+
+class Result(NamedTuple):
+    name: str
+    seconds: float  # best time per operation
+    peak_kib: float  # peak allocation of one call
+
+
+def feed_cases(sizes: list[str]) -> list[Case]:
+    from mta_api.services.feed_snapshot import FeedSnapshot
+    from mta_api.services.train_service import arrivals_from_snapshot, new_feed_message
+    from mta_api.utils.feed_fixtures import (
+        delay_trips,
+        feed_groups,
+        fixture_payload,
+        load_fixture,
+        route_stops,
+    )
+
+    cases = []
+    now = int(time.time())
+    for group, (url, *routes) in feed_groups().items():
+        for size in sizes:
+            payload = fixture_payload(group, size)
+            feed = load_fixture(group, size, now)
+            snapshot = FeedSnapshot.from_feed(url, feed)
+            refreshed = delay_trips(feed, REFRESH_CHURN)
+            stop_ids = sorted({stop for route in routes for stop in route_stops(route)})
+
+            def parse(payload=payload):
+                new_feed_message().ParseFromString(payload)
+
+            def index(url=url, feed=feed):
+                FeedSnapshot.from_feed(url, feed)
+
+            def reindex(url=url, feed=refreshed, previous=snapshot):
+                FeedSnapshot.from_feed(url, feed, previous)
+
+            def arrivals(snapshot=snapshot, stop_ids=stop_ids):
+                for stop_id in stop_ids:
+                    arrivals_from_snapshot(snapshot, stop_id)
+
+            cases += [
+                Case(f"parse:{group}:{size}", parse, 1),
+                Case(f"index:{group}:{size}", index, 1),
+                Case(f"reindex:{group}:{size}", reindex, 1),
+                Case(f"arrivals:{group}:{size}", arrivals, len(stop_ids)),
+            ]
+    return cases
+
+
+def station_cases() -> list[Case]:
+    from mta_api.api.routes import (
+        StationAutocomplete,
+        StationSearchIndex,
+        SubwayStationMatcher,
+        autocomplete_key,
+        normalize_station_name,
+    )
+    from mta_api.data.station_parser import (
+        get_stations_dict,
+        load_station_snapshot,
+        parse_subway_csv,
+        process_subway_data,
+    )
+
+    stations = get_stations_dict().values()
+    names = sorted({station.name for station in stations})
+    matcher = SubwayStationMatcher(names)
+    search_index = StationSearchIndex(stations)
+    autocomplete = StationAutocomplete(stations)
+
+    def clear_name_caches():
+        normalize_station_name.cache_clear()
+        autocomplete_key.cache_clear()
+
+    def clear_station_caches():
+        process_subway_data.cache_clear()
+        load_station_snapshot.cache_clear()
+
+    cases = [
+        Case(
+            "match:find_matches",
+            lambda: [matcher.find_matches(q) for q in MATCH_QUERIES],
+            len(MATCH_QUERIES),
+            setup=clear_name_caches,
+        ),
+        Case(
+            "match:search",
+            lambda: [search_index.search(q) for q in MATCH_QUERIES],
+            len(MATCH_QUERIES),
+        ),
+        Case(
+            "match:autocomplete",
+            lambda: [autocomplete.complete(q[:4]) for q in MATCH_QUERIES],
+            len(MATCH_QUERIES),
+            setup=clear_name_caches,
+        ),
+        Case("load:parse_csv", parse_subway_csv, 1),
+    ]
+    if load_station_snapshot() is not None:
+        cases.append(
+            Case("load:snapshot", process_subway_data, 1, setup=clear_station_caches)
+        )
+    return cases
+
+
+def measure(case: Case, repeat: int, min_time: float) -> Result:
+    def timed_call() -> float:
+        if case.setup:
+            case.setup()
+        start = time.perf_counter()
+        case.run()
+        return time.perf_counter() - start
+
+    # Calls per repeat so that a repeat lasts at least min_time
+    first = timed_call()
+    calls = max(1, int(min_time / max(first, 1e-9)))
+    # Like timeit, keep collector pauses triggered by earlier cases out of it
+    gc.collect()
+    gc.disable()
+    try:
+        best = min(
+            sum(timed_call() for _ in range(calls)) / calls for _ in range(repeat)
+        )
+    finally:
+        gc.enable()
+
+    if case.setup:
+        case.setup()
+    tracemalloc.start()
+    case.run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return Result(case.name, best / case.ops, peak / 1024 / case.ops)
+
+
+def load_baseline(path: Path = BASELINE_PATH) -> dict[str, dict[str, float]]:
+    return json.loads(path.read_text())["results"]
+
+
+def save_baseline(results: list[Result], path: Path = BASELINE_PATH) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {
+        "machine": platform.platform(),
+        "python": platform.python_version(),
+        "recorded_at": int(time.time()),
+        "results": {
+            result.name: {
+                "seconds": result.seconds,
+                "peak_kib": round(result.peak_kib, 2),
+            }
+            for result in results
+        },
+    }
+    path.write_text(json.dumps(data, indent=2) + "\n")
+
+
+def regressions(
+    results: list[Result], baseline: dict[str, dict[str, float]], threshold: float
+) -> list[str]:
+    """Descriptions of the results slower or hungrier than baseline by threshold"""
+    failures = []
+    for result in results:
+        base = baseline.get(result.name)
+        if base is None:
+            continue
+        for field, unit, value in (
+            ("seconds", "time", result.seconds),
+            ("peak_kib", "peak memory", result.peak_kib),
+        ):
+            # Ignore tiny absolute allocations, they are dominated by noise
+            if field == "peak_kib" and max(value, base[field]) < 16:
+                continue
+            if base[field] and value > base[field] * (1 + threshold):
+                failures.append(
+                    f"{result.name}: {unit} {value / base[field]:.2f}x baseline"
+                )
+    return failures
+
+
+def format_seconds(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f}us"
+    return f"{seconds * 1e3:.2f}ms"
+
+
+def main(argv: list[str] | None = None) -> int:
+    from mta_api.utils.feed_fixtures import SIZES
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-k", "--filter", default="*", help="glob on case names")
+    parser.add_argument("--size", action="append", choices=SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.05)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="compare to baseline")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    cases = [
+        case
+        for case in feed_cases(args.size or list(SIZES)) + station_cases()
+        if fnmatch.fnmatch(case.name, args.filter)
+    ]
+    baseline = load_baseline() if args.check else {}
+
+    results = []
+    print(f"{'case':32} {'per op':>10} {'peak/op':>11} {'vs base':>8}")
+    for case in cases:
+        result = measure(case, args.repeat, args.min_time)
+        results.append(result)
+        base = baseline.get(case.name)
+        ratio = f"{result.seconds / base['seconds']:.2f}x" if base else ""
+        print(
+            f"{result.name:32} {format_seconds(result.seconds):>10} "
+            f"{result.peak_kib:>8.1f}KiB {ratio:>8}"
+        )
+
+    if args.save_baseline:
+        save_baseline(results)
+        print(f"\nSaved baseline to {BASELINE_PATH}")
+    if args.check:
+        failures = regressions(results, baseline, args.threshold)
+        if failures:
+            print(f"\nFAIL: {len(failures)} regressions over {args.threshold:.0%}")
+            for failure in failures:
+                print(f"  {failure}")
+            return 1
+        print(f"\nOK: no regressions over {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+End-to-end load driver for the API.
+
+Keeps --concurrency requests in flight against a running API for
+--duration seconds, picking endpoints by --mix weights and arrivals
+pairs at random from the station data, then reports throughput and
+p50/p95/p99 latency per endpoint. Point the API at the mock feeds
+(mta_api.utils.mock_feeds) so the MTA isn't part of the test:
+
+    python -m mta_api.utils.load_test --concurrency 64 --duration 30
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from urllib.parse import quote
+
+import httpx
+import numpy as np
+
+# Logging every request would slow the driver itself down
+os.environ.setdefault("MTA_LOG_LEVEL", "WARNING")
+
+from mta_api.data.station_parser import get_stops_dict
+from mta_api.services.train_service import URL_DICT
+
+DEFAULT_MIX = "arrivals=8,routes=1,health=1"
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    """Parse "endpoint=weight,..." into weights"""
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.strip().partition("=")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def request_paths(seed: int = 0):
+    """A function returning a fresh request path, per endpoint"""
+    rnd = random.Random(seed)
+    # Names with a "/" can't be addressed in the arrivals path
+    pairs = [
+        (route, station)
+        for station, route in get_stops_dict()
+        if route in URL_DICT and "/" not in station
+    ]
+    routes = sorted(URL_DICT)
+    return {
+        "arrivals": lambda: "/api/v1/arrivals/{}/{}".format(
+            *(quote(part) for part in rnd.choice(pairs))
+        ),
+        "routes": lambda: "/api/v1/routes",
+        "route_stops": lambda: f"/api/v1/routes/{rnd.choice(routes)}",
+        "health": lambda: "/api/v1/health",
+    }
+
+
+async def run_load(
+    base_url: str, mix: dict[str, float], concurrency: int, duration: float
+) -> tuple[dict[str, list[float]], dict[str, dict[str, int]], float]:
+    """Latencies and status counts per endpoint, and the elapsed seconds"""
+    paths = request_paths()
+    endpoints = list(mix)
+    weights = [mix[endpoint] for endpoint in endpoints]
+    latencies: dict[str, list[float]] = defaultdict(list)
+    statuses: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    deadline = time.perf_counter() + duration
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        while time.perf_counter() < deadline:
+            endpoint = random.choices(endpoints, weights)[0]
+            start = time.perf_counter()
+            try:
+                response = await client.get(paths[endpoint]())
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies[endpoint].append(time.perf_counter() - start)
+            statuses[endpoint][status] += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=30
+    ) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return latencies, statuses, elapsed
+
+
+def report(
+    latencies: dict[str, list[float]],
+    statuses: dict[str, dict[str, int]],
+    elapsed: float,
+) -> None:
+    print(
+        f"{'endpoint':12} {'requests':>9} {'req/s':>8} "
+        f"{'p50':>9} {'p95':>9} {'p99':>9}  statuses"
+    )
+    everything = [latency for values in latencies.values() for latency in values]
+    rows = [*latencies.items(), ("total", everything)]
+    for endpoint, values in rows:
+        p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+        if endpoint == "total":
+            counts: dict[str, int] = defaultdict(int)
+            for endpoint_statuses in statuses.values():
+                for status, count in endpoint_statuses.items():
+                    counts[status] += count
+        else:
+            counts = statuses[endpoint]
+        status_text = ", ".join(f"{s}: {n}" for s, n in sorted(counts.items()))
+        print(
+            f"{endpoint:12} {len(values):>9} {len(values) / elapsed:>8.1f} "
+            f"{p50:>7.1f}ms {p95:>7.1f}ms {p99:>7.1f}ms  {status_text}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument(
+        "--mix",
+        default=DEFAULT_MIX,
+        help="endpoint weights; endpoints: arrivals, routes, route_stops, health",
+    )
+    args = parser.parse_args(argv)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    mix = parse_mix(args.mix)
+    unknown = set(mix) - set(request_paths())
+    if unknown:
+        parser.error(f"unknown endpoints in --mix: {', '.join(sorted(unknown))}")
+
+    latencies, statuses, elapsed = asyncio.run(
+        run_load(args.base_url, mix, args.concurrency, args.duration)
+    )
+    if not latencies:
+        print("No requests completed")
+        return 1
+    report(latencies, statuses, elapsed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
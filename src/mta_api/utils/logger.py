@@ -1,12 +1,121 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
 import sys
+from contextvars import ContextVar
 
-# Basic logger setup
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler(sys.stdout), logging.FileHandler("mta_api.log")],
-)
+LOG_LEVEL = os.getenv("MTA_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("MTA_LOG_FORMAT", "text")  # "text" or "json"
+LOG_FILE = os.getenv("MTA_LOG_FILE", "mta_api.log")  # empty to disable
+LOG_QUEUE_SIZE = int(os.getenv("MTA_LOG_QUEUE_SIZE", "10000"))
+# Comma separated "path prefix=rate" pairs, e.g. "/api/v1/arrivals=0.05"
+LOG_SAMPLING = os.getenv("MTA_LOG_SAMPLING", "")
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Request path of the request being handled, set by the app middleware
+request_path: ContextVar[str | None] = ContextVar("request_path", default=None)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        path = getattr(record, "request_path", None)
+        if path:
+            entry["path"] = path
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def parse_sampling(spec: str) -> list[tuple[str, float]]:
+    """Parse "prefix=rate,..." into (prefix, rate) pairs, longest prefix first"""
+    rates = []
+    for item in spec.split(","):
+        prefix, sep, rate = item.strip().partition("=")
+        if sep:
+            rates.append((prefix.strip(), float(rate)))
+    return sorted(rates, key=lambda pair: len(pair[0]), reverse=True)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a fraction of the INFO-and-below records logged while serving
+    matching request paths. Warnings and errors are always kept.
+    """
+
+    def __init__(self, rates: list[tuple[str, float]]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        path = request_path.get()
+        record.request_path = path
+        if path is None or record.levelno >= logging.WARNING:
+            return True
+        for prefix, rate in self.rates:
+            if path.startswith(prefix):
+                return random.random() < rate
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full"""
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The default formats the message in the calling thread first; the
+        # record stays in this process, so leave that to the listener's
+        # handlers. Logged arguments must not be mutated after the call.
+        return record
+
+
+def _setup_logging() -> logging.handlers.QueueListener:
+    formatter: logging.Formatter = (
+        JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+    )
+    handlers: list[logging.Handler] = [logging.StreamHandler(sys.stdout)]
+    if LOG_FILE:
+        handlers.append(logging.FileHandler(LOG_FILE))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # Callers only enqueue; a background thread does the formatting and I/O
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(parse_sampling(LOG_SAMPLING)))
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+_listener = _setup_logging()
 
 
 # Create a logger
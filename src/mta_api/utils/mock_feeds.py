@@ -0,0 +1,123 @@
+"""
+Local stand-in for the MTA GTFS-RT endpoints, for load testing.
+
+Serves every feed in URL_DICT from the feed fixtures, time-shifted so
+the arrivals look current. The feeds "refresh" every --refresh seconds
+and answer If-None-Match with 304 like the real endpoints. Latency,
+errors and hung requests can be injected:
+
+    python -m mta_api.utils.mock_feeds --port 9000 --latency-ms 80 --error-rate 0.02
+    MTA_FEED_BASE_URL=http://127.0.0.1:9000 uvicorn mta_api.main:app
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from urllib.parse import unquote
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+from mta_api.utils.feed_fixtures import SIZES, feed_groups, load_fixture
+from mta_api.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class MockFeedConfig:
+    size: str = "typical"
+    refresh: float = 30.0  # seconds between feed generations
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0  # fraction answered with 503
+    timeout_rate: float = 0.0  # fraction that hang for timeout_s
+    timeout_s: float = 60.0
+
+
+class MockFeeds:
+    """Time-shifted fixture payloads, re-serialized once per generation"""
+
+    def __init__(self, config: MockFeedConfig):
+        self.config = config
+        self._payloads: dict[str, tuple[int, bytes]] = {}
+
+    def generation(self) -> int:
+        return int(time.time() // self.config.refresh * self.config.refresh)
+
+    def payload(self, group: str) -> tuple[int, bytes]:
+        generation = self.generation()
+        cached = self._payloads.get(group)
+        if cached is None or cached[0] != generation:
+            feed = load_fixture(group, self.config.size, generation)
+            cached = (generation, feed.SerializeToString())
+            self._payloads[group] = cached
+        return cached
+
+    async def serve(self, request: Request) -> Response:
+        # e.g. /nyct%2Fgtfs-ace; the group is the last path segment
+        group = unquote(request.url.path).rstrip("/").rsplit("/", 1)[-1]
+        if group not in feed_groups():
+            return Response(status_code=404)
+
+        config = self.config
+        delay = config.latency_ms + random.uniform(-1, 1) * config.jitter_ms
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        roll = random.random()
+        if roll < config.timeout_rate:
+            await asyncio.sleep(config.timeout_s)
+            return Response(status_code=504)
+        if roll < config.timeout_rate + config.error_rate:
+            return Response(status_code=503)
+
+        generation, payload = self.payload(group)
+        etag = f'"{group}-{generation}"'
+        if request.headers.get("If-None-Match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(
+            payload,
+            media_type="application/x-protobuf",
+            headers={"ETag": etag},
+        )
+
+
+def create_app(config: MockFeedConfig) -> Starlette:
+    feeds = MockFeeds(config)
+    return Starlette(routes=[Route("/{path:path}", feeds.serve)])
+
+
+def main(argv: list[str] | None = None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--size", choices=SIZES, default="typical")
+    parser.add_argument("--refresh", type=float, default=30.0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-s", type=float, default=60.0)
+    args = parser.parse_args(argv)
+
+    config = MockFeedConfig(
+        size=args.size,
+        refresh=args.refresh,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        timeout_s=args.timeout_s,
+    )
+    logger.info("Serving mock feeds on %s:%s with %s", args.host, args.port, config)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Cold-start report for the API process.
+
+Imports mta_api.main in a fresh interpreter with -X importtime, then
+prints the slowest imports and the time per package, optionally with the
+warm-up steps. With a budget it exits non-zero when the import (or the
+warm-up) is over budget, so CI can enforce it:
+
+    python -m mta_api.utils.startup --budget-ms 800 --warm-up-budget-ms 300
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import NamedTuple
+
+TARGET_MODULE = "mta_api.main"
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module} as target
+imported = time.perf_counter() - start
+warm_up = target.warm_up() if {warm_up} else {{}}
+print(json.dumps({{"import": imported, "warm_up": warm_up}}))
+"""
+
+
+class ImportTime(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(stderr: str) -> list[ImportTime]:
+    """Parse the "import time: self | cumulative | name" lines of -X importtime"""
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        records.append(
+            ImportTime(name.strip(), int(self_us), int(cumulative_us), depth)
+        )
+    return records
+
+
+def measure(module: str = TARGET_MODULE, warm_up: bool = False) -> dict:
+    """Import module in a fresh interpreter and collect its startup timings"""
+    env = dict(os.environ, MTA_FEED_POLLER="0")
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            _PROBE.format(module=module, warm_up=warm_up),
+        ],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["imports"] = parse_importtime(result.stderr)
+    return timings
+
+
+def by_package(imports: list[ImportTime]) -> dict[str, int]:
+    """Self import time in microseconds summed per top-level package"""
+    totals: dict[str, int] = defaultdict(int)
+    for record in imports:
+        totals[record.module.split(".")[0]] += record.self_us
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default=TARGET_MODULE)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--warm-up", action="store_true", help="also time warm_up()")
+    parser.add_argument("--budget-ms", type=float, help="fail if import is slower")
+    parser.add_argument(
+        "--warm-up-budget-ms", type=float, help="fail if warm-up is slower"
+    )
+    args = parser.parse_args(argv)
+
+    warm_up = args.warm_up or args.warm_up_budget_ms is not None
+    timings = measure(args.module, warm_up=warm_up)
+    imports = timings["imports"]
+    import_ms = timings["import"] * 1000
+
+    print(f"import {args.module}: {import_ms:.1f}ms")
+    print(f"\nSlowest imports (cumulative, top {args.top}):")
+    for record in sorted(imports, key=lambda r: r.cumulative_us, reverse=True)[
+        : args.top
+    ]:
+        print(f"  {record.cumulative_us / 1000:8.1f}ms  {record.module}")
+
+    print("\nSelf time per package:")
+    for package, self_us in list(by_package(imports).items())[: args.top]:
+        print(f"  {self_us / 1000:8.1f}ms  {package}")
+
+    warm_up_ms = 0.0
+    if warm_up:
+        print("\nWarm-up steps:")
+        for step, seconds in timings["warm_up"].items():
+            print(f"  {seconds * 1000:8.1f}ms  {step}")
+            warm_up_ms += seconds * 1000
+        print(f"  {warm_up_ms:8.1f}ms  total")
+
+    failed = False
+    if args.budget_ms is not None and import_ms > args.budget_ms:
+        print(f"\nFAIL: import took {import_ms:.1f}ms, budget {args.budget_ms}ms")
+        failed = True
+    if args.warm_up_budget_ms is not None and warm_up_ms > args.warm_up_budget_ms:
+        print(
+            f"\nFAIL: warm-up took {warm_up_ms:.1f}ms, "
+            f"budget {args.warm_up_budget_ms}ms"
+        )
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+import time
+from dataclasses import replace
+
+from fastapi.testclient import TestClient
+
+import mta_api.main as main
+from mta_api.services.feed_snapshot import FeedSnapshot
+from mta_api.services.response_cache import ArrivalsResponseCache
+from mta_api.services.train_service import URL_DICT, new_feed_message
+
+NOW = 1729773000
+PATH = "/api/v1/arrivals/1/Times Sq-42 St"
+
+
+def two_trains_feed():
+    """Two southbound 1 trains at Times Sq, 100 and 400 seconds out"""
+    feed = new_feed_message()
+    feed.header.gtfs_realtime_version = "1.0"
+    feed.header.timestamp = NOW
+    for number, seconds in enumerate((100, 400)):
+        trip_update = feed.entity.add(id=str(number)).trip_update
+        trip_update.trip.trip_id = f"0{number}_1..S"
+        trip_update.trip.route_id = "1"
+        stop_time_update = trip_update.stop_time_update.add(stop_id="127S")
+        stop_time_update.arrival.time = NOW + seconds
+    return feed
+
+
+def test_etag_changes_when_the_clock_moves_a_train_out(monkeypatch):
+    snapshot = replace(
+        FeedSnapshot.from_feed(URL_DICT["1"], two_trains_feed()), fetched_at=NOW
+    )
+
+    async def get_feed_snapshot(route):
+        return snapshot
+
+    clock = [NOW]
+    monkeypatch.setattr(main, "get_feed_snapshot", get_feed_snapshot)
+    monkeypatch.setattr(main, "arrivals_cache", ArrivalsResponseCache())
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    client = TestClient(main.app)
+
+    first = client.get(PATH)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    max_age = int(first.headers["Cache-Control"].rsplit("=", 1)[1])
+    assert 0 <= max_age <= 100
+
+    clock[0] = NOW + 50
+    assert client.get(PATH, headers={"If-None-Match": etag}).status_code == 304
+
+    # The first train has left, so the cached body and its ETag are stale
+    clock[0] = NOW + 150
+    second = client.get(PATH, headers={"If-None-Match": etag})
+    assert second.status_code == 200
+    assert second.headers["ETag"] != etag
+    assert second.content != first.content
@@ -0,0 +1,47 @@
+import asyncio
+
+from mta_api.services.feed_cache import FeedCache
+
+
+def test_cancelled_leader_does_not_cancel_coalesced_callers():
+    async def scenario():
+        release = asyncio.Event()
+        calls = []
+
+        async def fetcher(url):
+            calls.append(url)
+            await release.wait()
+            return f"feed {url}"
+
+        cache = FeedCache(fetcher, ttl=60)
+        leader = asyncio.create_task(cache.get("a"))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get("a"))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await follower == "feed a"
+        assert leader.cancelled()
+        assert calls == ["a"]
+        assert await cache.get("a") == "feed a"
+        assert cache.stats() == {"hit": 1, "miss": 1, "coalesced": 1}
+
+    asyncio.run(scenario())
+
+
+def test_fetch_errors_reach_every_caller():
+    async def scenario():
+        async def fetcher(url):
+            await asyncio.sleep(0)
+            raise RuntimeError("upstream down")
+
+        cache = FeedCache(fetcher)
+        results = await asyncio.gather(
+            cache.get("a"), cache.get("a"), return_exceptions=True
+        )
+        assert [str(r) for r in results] == ["upstream down"] * 2
+
+    asyncio.run(scenario())
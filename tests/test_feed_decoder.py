@@ -0,0 +1,135 @@
+from collections import Counter
+
+import pytest
+
+from mta_api.services.feed_decoder import (
+    DIRECTIONS,
+    decode_feed,
+    decode_feed_changes,
+)
+from mta_api.utils.feed_fixtures import delay_trips, synthesize_feed
+
+
+def rows(columns):
+    """The rows of columns as comparable tuples, in no particular order"""
+    return Counter(
+        (
+            columns.stop_ids[stop],
+            DIRECTIONS[direction],
+            columns.route_ids[route],
+            columns.trip_ids[trip],
+            arrival,
+        )
+        for stop, direction, route, trip, arrival in zip(
+            columns.stop.tolist(),
+            columns.direction.tolist(),
+            columns.route.tolist(),
+            columns.trip.tolist(),
+            columns.arrival.tolist(),
+        )
+    )
+
+
+def boards(columns):
+    """(stop ID, direction) -> the arrivals on that board"""
+    by_board: dict = {}
+    for (stop_id, direction, *row), n in rows(columns).items():
+        by_board.setdefault((stop_id, direction), Counter())[tuple(row)] += n
+    return by_board
+
+
+def changed_boards(old, new):
+    old_boards, new_boards = boards(old), boards(new)
+    return {
+        key
+        for key in old_boards.keys() | new_boards.keys()
+        if old_boards.get(key) != new_boards.get(key)
+    }
+
+
+def drop_trips(feed, every):
+    """A copy of feed without every n-th trip update"""
+    dropped = type(feed)()
+    dropped.CopyFrom(feed)
+    trips = [e for e in dropped.entity if e.HasField("trip_update")]
+    for entity in trips[::every]:
+        dropped.entity.remove(entity)
+    return dropped
+
+
+def duplicate_trips(feed, every, later=30):
+    """
+    A copy of feed where every n-th trip update appears twice, the copy
+    arriving later seconds later
+    """
+    duplicated = type(feed)()
+    duplicated.CopyFrom(feed)
+    trips = [e for e in duplicated.entity if e.HasField("trip_update")]
+    for entity in trips[::every]:
+        copy = duplicated.entity.add()
+        copy.CopyFrom(entity)
+        copy.id += "-again"
+        for stop_time_update in copy.trip_update.stop_time_update:
+            if stop_time_update.HasField("arrival"):
+                stop_time_update.arrival.time += later
+    return duplicated
+
+
+@pytest.fixture(scope="module")
+def feed():
+    return synthesize_feed("gtfs-ace", "typical")
+
+
+REFRESHES = {
+    "unchanged": lambda feed: feed,
+    "some delayed": lambda feed: delay_trips(feed, 0.2),
+    "all delayed": lambda feed: delay_trips(feed, 1.0),
+    "trips dropped": lambda feed: drop_trips(delay_trips(feed, 0.1), 7),
+    "trips duplicated": lambda feed: duplicate_trips(feed, 5),
+    "trips repeated exactly": lambda feed: duplicate_trips(feed, 5, later=0),
+    "duplicates dropped": lambda feed: duplicate_trips(drop_trips(feed, 3), 4),
+}
+
+
+@pytest.mark.parametrize("refresh", REFRESHES)
+def test_changes_match_a_full_decode(feed, refresh):
+    new_feed = REFRESHES[refresh](feed)
+    previous = decode_feed(feed)
+    columns, changed = decode_feed_changes(new_feed, feed, previous)
+    expected = decode_feed(new_feed)
+
+    assert rows(columns) == rows(expected)
+    assert changed_boards(previous, expected) <= changed
+
+
+@pytest.mark.parametrize("refresh", REFRESHES)
+def test_changes_from_duplicated_previous_feed(feed, refresh):
+    previous_feed = duplicate_trips(feed, 3)
+    new_feed = REFRESHES[refresh](feed)
+    previous = decode_feed(previous_feed)
+    columns, changed = decode_feed_changes(new_feed, previous_feed, previous)
+    expected = decode_feed(new_feed)
+
+    assert rows(columns) == rows(expected)
+    assert changed_boards(previous, expected) <= changed
+
+
+def test_changes_chain_across_refreshes(feed):
+    previous_feed, previous = feed, decode_feed(feed)
+    for seed in range(5):
+        new_feed = delay_trips(previous_feed, 0.3, seed=seed)
+        if seed % 2:
+            new_feed = drop_trips(new_feed, 9)
+        columns, changed = decode_feed_changes(new_feed, previous_feed, previous)
+        expected = decode_feed(new_feed)
+
+        assert rows(columns) == rows(expected)
+        assert changed_boards(previous, expected) <= changed
+        previous_feed, previous = new_feed, columns
+
+
+def test_unchanged_feed_reuses_every_row(feed):
+    previous = decode_feed(feed)
+    columns, changed = decode_feed_changes(feed, feed, previous)
+    assert changed == frozenset()
+    assert columns.reused == len(previous)
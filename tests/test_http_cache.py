@@ -0,0 +1,119 @@
+import gzip
+import json
+from types import SimpleNamespace
+
+import pytest
+from starlette.requests import Request
+
+from mta_api.api import http_cache
+from mta_api.api.http_cache import EncodedBody, accepted_encodings, etag_matches
+
+CONTENT = {"routes": ["1", "2", "3"], "stops": ["Times Sq-42 St"] * 20}
+
+
+def request(**headers):
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/",
+            "headers": [
+                (k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()
+            ],
+        }
+    )
+
+
+@pytest.fixture
+def fake_brotli(monkeypatch):
+    module = SimpleNamespace(compress=lambda data, quality: b"br:" + data)
+    monkeypatch.setattr(http_cache, "_brotli", lambda: module)
+    return module
+
+
+@pytest.mark.parametrize(
+    "header, etag, expected",
+    [
+        (None, '"abc"', False),
+        ("", '"abc"', False),
+        ('"abc"', '"abc"', True),
+        ('"abd"', '"abc"', False),
+        ('"x", "abc"', '"abc"', True),
+        ('W/"abc"', '"abc"', True),
+        ('"abc"', 'W/"abc"', True),
+        ("*", '"abc"', True),
+        (' "abc" ', '"abc"', True),
+    ],
+)
+def test_etag_matches(header, etag, expected):
+    assert etag_matches(header, etag) is expected
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("gzip, br;q=0.5, deflate;q=x, ") == {
+        "gzip": 1.0,
+        "br": 0.5,
+        "deflate": 0.0,
+    }
+    assert accepted_encodings(None) == {}
+
+
+@pytest.mark.parametrize(
+    "header, coding",
+    [
+        (None, "identity"),
+        ("gzip", "gzip"),
+        ("gzip, deflate, br", "br"),
+        ("br;q=0, gzip", "gzip"),
+        ("GZIP;q=0.1", "gzip"),
+        ("*", "br"),
+        ("*, br;q=0", "gzip"),
+        ("deflate", "identity"),
+    ],
+)
+def test_coding_for(fake_brotli, header, coding):
+    assert EncodedBody(CONTENT).coding_for(header) == coding
+
+
+def test_brotli_is_not_offered_without_the_package(monkeypatch):
+    monkeypatch.setattr(http_cache, "_brotli", lambda: None)
+    body = EncodedBody(CONTENT)
+    assert "br" not in body.variants
+    assert body.coding_for("br, gzip") == "gzip"
+    assert body.coding_for("br") == "identity"
+
+
+def test_variants_have_their_own_etags(fake_brotli):
+    body = EncodedBody(CONTENT)
+    etags = {etag for _, etag in body.variants.values()}
+    assert len(etags) == len(body.variants) == 3
+
+    raw, _ = body.variants["identity"]
+    assert json.loads(raw) == CONTENT
+    assert gzip.decompress(body.variants["gzip"][0]) == raw
+    # Deterministic, so every worker hands out the same ETags
+    assert EncodedBody(CONTENT).variants == body.variants
+
+
+def test_response(monkeypatch):
+    monkeypatch.setattr(http_cache, "_brotli", lambda: None)
+    body = EncodedBody(CONTENT, max_age=60)
+
+    response = body.response(request(accept_encoding="gzip"))
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.headers["Cache-Control"] == "public, max-age=60"
+    assert gzip.decompress(response.body) == body.variants["identity"][0]
+
+    plain = body.response(request())
+    assert "Content-Encoding" not in plain.headers
+    assert plain.body == body.variants["identity"][0]
+
+    etag = response.headers["ETag"]
+    not_modified = body.response(request(accept_encoding="gzip", if_none_match=etag))
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == etag
+    assert not not_modified.body
+    # The gzip ETag doesn't validate the identity body
+    assert body.response(request(if_none_match=etag)).status_code == 200
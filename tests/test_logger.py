@@ -0,0 +1,24 @@
+import logging
+import queue
+
+from mta_api.utils.logger import DroppingQueueHandler
+
+
+def test_records_are_queued_unformatted():
+    log_queue: queue.Queue = queue.Queue()
+    handler = DroppingQueueHandler(log_queue)
+    handler.handle(logging.makeLogRecord({"msg": "formatted %s", "args": ("later",)}))
+
+    record = log_queue.get_nowait()
+    # Message merging and formatting are left to the listener's thread
+    assert (record.msg, record.args) == ("formatted %s", ("later",))
+    assert record.getMessage() == "formatted later"
+
+
+def test_full_queue_drops_records():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    record = logging.makeLogRecord({"msg": "x"})
+    dropped = DroppingQueueHandler.dropped
+    handler.handle(record)
+    handler.handle(record)
+    assert DroppingQueueHandler.dropped == dropped + 1
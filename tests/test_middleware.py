@@ -0,0 +1,61 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from mta_api.api.middleware import RequestMetricsMiddleware
+from mta_api.utils.logger import request_path
+
+
+def request_seconds(path, status):
+    labels = {"method": "GET", "path": path, "status": status}
+    return (
+        REGISTRY.get_sample_value("mta_http_request_seconds_count", labels) or 0,
+        REGISTRY.get_sample_value("mta_http_request_seconds_sum", labels) or 0,
+    )
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(RequestMetricsMiddleware)
+
+    @app.get("/test/path/{item}")
+    async def path(item: str):
+        return {"request_path": request_path.get()}
+
+    @app.get("/test/stream")
+    async def stream():
+        async def events():
+            yield b"first\n"
+            await asyncio.sleep(0.2)
+            yield b"last\n"
+
+        return StreamingResponse(events())
+
+    return app
+
+
+def test_labels_by_route_template_and_sets_request_path():
+    client = TestClient(make_app())
+    count, _ = request_seconds("/test/path/{item}", "200")
+
+    response = client.get("/test/path/abc")
+    assert response.json() == {"request_path": "/test/path/abc"}
+    assert request_seconds("/test/path/{item}", "200")[0] == count + 1
+    assert request_path.get() is None
+
+    unmatched, _ = request_seconds("unmatched", "404")
+    assert client.get("/test/nowhere").status_code == 404
+    assert request_seconds("unmatched", "404")[0] == unmatched + 1
+
+
+def test_streams_are_timed_until_the_body_completes():
+    client = TestClient(make_app())
+    count, total = request_seconds("/test/stream", "200")
+
+    assert client.get("/test/stream").content == b"first\nlast\n"
+    new_count, new_total = request_seconds("/test/stream", "200")
+    assert new_count == count + 1
+    assert new_total - total >= 0.2
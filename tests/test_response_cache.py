@@ -0,0 +1,115 @@
+import numpy as np
+
+from mta_api.services.feed_snapshot import ArrivalsIndex, FeedSnapshot
+from mta_api.services.response_cache import ArrivalsResponseCache
+
+URL = "https://feeds.example/nyct%2Fgtfs"
+OTHER_URL = "https://feeds.example/nyct%2Fgtfs-ace"
+EMPTY_INDEX = ArrivalsIndex.from_arrays(
+    [], np.empty(0, np.int64), np.empty(0, np.int16), {}
+)
+
+
+def snapshot(generation, changed=None, since=None, url=URL):
+    """A snapshot fetched at its generation, changed since the fetch time since"""
+    return FeedSnapshot(
+        url=url,
+        feed=None,
+        index=EMPTY_INDEX,
+        fetched_at=generation,
+        timestamp=generation,
+        changed_boards=None if changed is None else frozenset(changed),
+        changed_since=since,
+    )
+
+
+def test_get_checks_generation_and_expiry():
+    cache = ArrivalsResponseCache()
+    cache.put(snapshot(100), "1", "127", b"body", expires_at=160)
+
+    assert cache.get(100, "1", "127", now=120).body == b"body"
+    assert cache.get(100, "1", "127", now=160) is None
+    assert cache.get(200, "1", "127", now=120) is None
+    assert cache.get(100, "2", "127", now=120) is None
+    assert (cache.hits, cache.misses) == (1, 3)
+
+    cache.put(snapshot(100), "1", "128", b"body")
+    assert cache.get(100, "1", "128", now=10**10) is not None
+
+
+def test_evicts_least_recently_used_entries():
+    cache = ArrivalsResponseCache(max_entries=2)
+    cache.put(snapshot(100), "1", "a", b"a")
+    cache.put(snapshot(100), "1", "b", b"b")
+    assert cache.get(100, "1", "a", now=0) is not None
+    cache.put(snapshot(100), "1", "c", b"c")
+
+    assert cache.get(100, "1", "b", now=0) is None
+    assert cache.get(100, "1", "a", now=0) is not None
+    assert len(cache) == 2 and cache.evictions == 1
+
+
+def test_evicts_to_stay_within_the_byte_budget():
+    cache = ArrivalsResponseCache(max_bytes=10)
+    cache.put(snapshot(100), "1", "a", b"x" * 4)
+    cache.put(snapshot(100), "1", "b", b"x" * 4)
+    cache.put(snapshot(100), "1", "c", b"x" * 4)
+    assert cache.stats()["bytes"] == 8
+    assert cache.get(100, "1", "a", now=0) is None
+
+    # Replacing an entry accounts for the old body
+    cache.put(snapshot(100), "1", "c", b"x" * 2)
+    assert cache.stats()["bytes"] == 6
+
+    # Bodies over the whole budget aren't cached
+    cache.put(snapshot(100), "1", "d", b"x" * 11)
+    assert cache.get(100, "1", "d", now=0) is None
+    assert cache.stats()["bytes"] == 6
+
+
+def test_publish_carries_over_unchanged_boards():
+    cache = ArrivalsResponseCache()
+    cache.publish(snapshot(100))
+    cache.put(snapshot(100), "1", "127", b"unchanged", expires_at=500)
+    cache.put(snapshot(100), "1", "128", b"changed")
+    cache.put(snapshot(100, url=OTHER_URL), "A", "A27", b"other feed")
+
+    cache.publish(snapshot(200, changed={("128", "N")}, since=100))
+
+    carried = cache.get(200, "1", "127", now=0)
+    assert carried.body == b"unchanged" and carried.expires_at == 500
+    assert cache.get(200, "1", "128", now=0) is None
+    assert cache.get(100, "A", "A27", now=0) is not None
+    assert cache.invalidations == 1
+
+
+def test_publish_invalidates_without_a_matching_change_set():
+    cache = ArrivalsResponseCache()
+    # Nothing published before: the change set isn't known to be relative
+    # to the entries' generation
+    cache.put(snapshot(100), "1", "127", b"a")
+    cache.publish(snapshot(200, changed=set(), since=100))
+    assert cache.get(200, "1", "127", now=0) is None
+
+    # Changes since another snapshot than the last one published
+    cache.put(snapshot(200), "1", "127", b"b")
+    cache.publish(snapshot(300, changed=set(), since=250))
+    assert cache.get(300, "1", "127", now=0) is None
+
+    # Changes unknown
+    cache.put(snapshot(300), "1", "127", b"c")
+    cache.publish(snapshot(400))
+    assert cache.get(400, "1", "127", now=0) is None
+    assert cache.invalidations == 3
+
+
+def test_publish_drops_entries_of_older_generations():
+    cache = ArrivalsResponseCache()
+    cache.publish(snapshot(100))
+    cache.put(snapshot(100), "1", "127", b"a")
+    cache.publish(snapshot(200, changed=set(), since=100))
+    cache.put(snapshot(50), "1", "128", b"stale")
+
+    cache.publish(snapshot(300, changed=set(), since=200))
+    assert cache.get(300, "1", "127", now=0) is not None
+    assert cache.get(300, "1", "128", now=0) is None
@@ -0,0 +1,102 @@
+import pytest
+
+from mta_api.services.feed_decoder import DIRECTIONS
+from mta_api.services.feed_snapshot import FeedSnapshot
+from mta_api.services.shared_feeds import (
+    SharedFeedReader,
+    SharedFeedWriter,
+    decode_region,
+    encode_snapshot,
+)
+from mta_api.utils.feed_fixtures import (
+    BASE_TIME,
+    delay_trips,
+    feed_groups,
+    route_stops,
+    synthesize_feed,
+)
+
+GROUP = "gtfs-nqrw"
+URL, *ROUTES = feed_groups()[GROUP]
+END = BASE_TIME + 30 * 60
+
+
+@pytest.fixture(scope="module")
+def snapshots():
+    feed = synthesize_feed(GROUP, "small")
+    first = FeedSnapshot.from_feed(URL, feed)
+    second = FeedSnapshot.from_feed(URL, delay_trips(feed, 0.5), first)
+    return first, second
+
+
+def boards(snapshot):
+    """Every board's arrivals, in full and per route"""
+    stop_ids = {stop_id for route in ROUTES for stop_id in route_stops(route)}
+    return {
+        (stop_id, direction, route): snapshot.index.upcoming(
+            stop_id, direction, BASE_TIME - 300, END, route=route
+        )
+        for stop_id in stop_ids
+        for direction in DIRECTIONS
+        for route in (None, *ROUTES)
+    }
+
+
+def test_region_round_trip(snapshots):
+    for snapshot in snapshots:
+        shared = decode_region(encode_snapshot(snapshot))
+        assert shared.feed is None and shared.index.columns is None
+        assert shared.url == snapshot.url
+        assert shared.generation == snapshot.generation
+        assert shared.fetched_at == snapshot.fetched_at
+        assert shared.changed_boards == snapshot.changed_boards
+        assert shared.changed_since == snapshot.changed_since
+        assert shared.index.route_ids == snapshot.index.route_ids
+        assert boards(shared) == boards(snapshot)
+    assert any(boards(snapshots[0]).values())
+
+
+def test_decode_region_rejects_other_data():
+    with pytest.raises(ValueError):
+        decode_region(b"\0" * 64)
+
+
+def test_reader_remaps_when_the_sequence_moves(tmp_path, snapshots):
+    first, second = snapshots
+    writer = SharedFeedWriter(tmp_path, [URL])
+    try:
+        reader = SharedFeedReader(tmp_path, [URL])
+        assert reader.get(URL) is None
+
+        writer.publish(first)
+        mapped = reader.get(URL)
+        assert mapped is not None and mapped.generation == first.generation
+        # Same sequence number: the existing mapping is reused
+        assert reader.get(URL) is mapped
+
+        writer.publish(second)
+        remapped = reader.get(URL)
+        assert remapped is not mapped
+        assert remapped.generation == second.generation
+        assert boards(remapped) == boards(second)
+        # The replaced region stays readable while a snapshot uses it
+        assert boards(mapped) == boards(first)
+    finally:
+        writer.close()
+
+
+def test_one_writer_per_directory(tmp_path):
+    writer = SharedFeedWriter(tmp_path, [URL])
+    try:
+        with pytest.raises(RuntimeError):
+            SharedFeedWriter(tmp_path, [URL])
+    finally:
+        writer.close()
+
+
+def test_snapshot_after_a_shared_one_is_decoded_in_full(snapshots):
+    first, second = snapshots
+    shared = decode_region(encode_snapshot(first))
+    snapshot = FeedSnapshot.from_feed(URL, second.feed, shared)
+    assert snapshot.changed_boards is None
+    assert boards(snapshot) == boards(second)
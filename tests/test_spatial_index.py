@@ -0,0 +1,43 @@
+import random
+
+import pytest
+
+from mta_api.data.spatial_index import StationGrid, haversine
+from mta_api.data.station_parser import get_coords_dict
+
+
+@pytest.fixture(scope="module")
+def coords():
+    return get_coords_dict()
+
+
+@pytest.fixture(scope="module")
+def grid(coords):
+    return StationGrid(coords)
+
+
+def brute_force(coords, lon, lat, k):
+    return sorted(
+        (haversine(lon, lat, stop_lon, stop_lat), stop_id)
+        for stop_id, (stop_lon, stop_lat) in coords.items()
+    )[:k]
+
+
+def test_nearest_matches_brute_force_in_the_city(coords, grid):
+    rnd = random.Random(0)
+    for _ in range(200):
+        lon, lat = rnd.uniform(-74.3, -73.7), rnd.uniform(40.5, 40.95)
+        k = rnd.choice((1, 5, 20))
+        assert grid.nearest(lon, lat, k) == brute_force(coords, lon, lat, k)
+
+
+@pytest.mark.parametrize(
+    "lon, lat",
+    [(179.0, -89.0), (-179.0, 89.0), (0.0, 0.0), (-73.9, 45.0), (-80.0, 40.7)],
+)
+def test_nearest_matches_brute_force_far_away(coords, grid, lon, lat):
+    assert grid.nearest(lon, lat, 5) == brute_force(coords, lon, lat, 5)
+
+
+def test_nearest_with_more_than_every_stop(coords, grid):
+    assert len(grid.nearest(-73.98, 40.75, len(coords) + 10)) == len(coords)
@@ -0,0 +1,36 @@
+import pytest
+
+from mta_api.api.routes import get_station_autocomplete, get_station_search_index
+
+
+@pytest.mark.parametrize(
+    "long_form, short_form, name",
+    [
+        ("bryant park", "bryant pk", "42 St-Bryant Pk"),
+        ("times square", "times sq", "Times Sq-42 St"),
+        ("barclays center", "barclays ctr", "Atlantic Av-Barclays Ctr"),
+        ("34 street herald square", "34 st herald sq", "34 St-Herald Sq"),
+    ],
+)
+def test_long_and_short_forms_search_alike(long_form, short_form, name):
+    index = get_station_search_index()
+    long_results, short_results = index.search(long_form), index.search(short_form)
+    assert long_results[0]["name"] == short_results[0]["name"] == name
+    assert long_results[0]["score"] == short_results[0]["score"]
+
+
+@pytest.mark.parametrize(
+    "spellings, name",
+    [
+        (("barclays ctr", "barclays center", "barclays centre"), "Barclays Ctr"),
+        (("bryant pk", "bryant park"), "42 St-Bryant Pk"),
+        (("herald sq", "herald square"), "34 St-Herald Sq"),
+        (("42 st", "42 street"), "Times Sq-42 St"),
+        (("ocean pkwy", "ocean parkway"), "Ocean Pkwy"),
+    ],
+)
+def test_long_and_short_forms_autocomplete_alike(spellings, name):
+    autocomplete = get_station_autocomplete()
+    completions = [autocomplete.complete(spelling) for spelling in spellings]
+    assert all(result == completions[0] for result in completions)
+    assert any(name in entry["name"] for entry in completions[0])